@@ -0,0 +1,56 @@
+"""sessions: indexes on user_id and created_at
+
+Revision ID: 8a3f0c6d5e21
+Revises: 5c1e7a9b2d40
+Create Date: 2026-10-17 11:03:27.905114
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8a3f0c6d5e21"
+down_revision: str | None = "5c1e7a9b2d40"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # sessions пишется при каждом входе: CONCURRENTLY не блокирует запись
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f("ix_sessions_user_id"),
+            "sessions",
+            ["user_id"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            op.f("ix_sessions_created_at"),
+            "sessions",
+            ["created_at"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            op.f("ix_sessions_created_at"),
+            table_name="sessions",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            op.f("ix_sessions_user_id"),
+            table_name="sessions",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,56 @@
+"""orders: index on (equipment_id, start_date, end_date)
+
+Revision ID: a2c4e6f8b1d3
+Revises: f3b7d9e2a5c8
+Create Date: 2026-10-17 16:52:37.904215
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a2c4e6f8b1d3"
+down_revision: str | None = "f3b7d9e2a5c8"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_orders_equipment_id_start_date_end_date",
+            "orders",
+            ["equipment_id", "start_date", "end_date"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # Покрывается новым индексом с тем же префиксом
+        op.drop_index(
+            "ix_orders_equipment_id",
+            table_name="orders",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_orders_equipment_id",
+            "orders",
+            ["equipment_id"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_orders_equipment_id_start_date_end_date",
+            table_name="orders",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
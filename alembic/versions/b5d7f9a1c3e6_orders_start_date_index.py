@@ -0,0 +1,41 @@
+"""orders: index on (start_date, id)
+
+Revision ID: b5d7f9a1c3e6
+Revises: a2c4e6f8b1d3
+Create Date: 2026-10-17 17:39:15.552046
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b5d7f9a1c3e6"
+down_revision: str | None = "a2c4e6f8b1d3"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_orders_start_date_id",
+            "orders",
+            ["start_date", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_orders_start_date_id",
+            table_name="orders",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,85 @@
+"""composite indexes for listing sorts and filters
+
+Revision ID: b7d2e4f91c03
+Revises: 8a3f0c6d5e21
+Create Date: 2026-10-17 12:41:09.552317
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d2e4f91c03"
+down_revision: str | None = "8a3f0c6d5e21"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# (имя, таблица, колонки)
+new_indexes = [
+    ("ix_equipment_title_id", "equipment", ["title", "id"]),
+    ("ix_equipment_is_available_id", "equipment", ["is_available", "id"]),
+    ("ix_equipment_owner_id_id", "equipment", ["owner_id", "id"]),
+    ("ix_equipment_category_id_id", "equipment", ["category_id", "id"]),
+    ("ix_equipment_category_id_title_id", "equipment", ["category_id", "title", "id"]),
+    (
+        "ix_equipment_category_id_is_available_id",
+        "equipment",
+        ["category_id", "is_available", "id"],
+    ),
+    (
+        "ix_equipment_category_id_owner_id_id",
+        "equipment",
+        ["category_id", "owner_id", "id"],
+    ),
+    ("ix_categories_title_id", "categories", ["title", "id"]),
+    ("ix_orders_customer_id_id", "orders", ["customer_id", "id"]),
+    ("ix_orders_equipment_id", "orders", ["equipment_id"]),
+]
+
+# Покрываются составными индексами с тем же префиксом
+old_indexes = [
+    ("ix_equipment_is_available", "equipment", ["is_available"]),
+    ("ix_equipment_owner_id", "equipment", ["owner_id"]),
+    ("ix_equipment_category_id", "equipment", ["category_id"]),
+    ("ix_orders_customer_id", "orders", ["customer_id"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE/DROP INDEX CONCURRENTLY не блокирует запись, но не может
+    # выполняться внутри транзакции.
+    with op.get_context().autocommit_block():
+        for name, table, columns in new_indexes:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+        for name, table, _ in old_indexes:
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True, if_exists=True
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in old_indexes:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+        for name, table, _ in reversed(new_indexes):
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True, if_exists=True
+            )
@@ -0,0 +1,70 @@
+"""equipment: full-text search vector and trigram index on title
+
+Revision ID: c4e8a1f7d392
+Revises: b7d2e4f91c03
+Create Date: 2026-10-17 13:20:44.180263
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c4e8a1f7d392"
+down_revision: str | None = "b7d2e4f91c03"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Колонка вычисляется самой БД; в модели она объявлена как отложенная
+    # Computed-колонка Equipment.search_vector. Добавление STORED-колонки
+    # переписывает таблицу под эксклюзивной блокировкой.
+    op.execute(
+        """
+        ALTER TABLE equipment ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('russian', coalesce(title, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(description, '')), 'B')
+        ) STORED
+        """
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_equipment_search_vector",
+            "equipment",
+            ["search_vector"],
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_equipment_title_trgm",
+            "equipment",
+            ["title"],
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"},
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_equipment_title_trgm",
+            table_name="equipment",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_equipment_search_vector",
+            table_name="equipment",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_column("equipment", "search_vector")
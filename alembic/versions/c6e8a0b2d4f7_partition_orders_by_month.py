@@ -0,0 +1,141 @@
+"""orders: monthly range partitioning on start_date, reservations periods
+
+Revision ID: c6e8a0b2d4f7
+Revises: b5d7f9a1c3e6
+Create Date: 2026-10-17 18:25:40.117392
+
+"""
+
+from collections.abc import Sequence
+from datetime import UTC, date, datetime
+
+import sqlalchemy as sa
+
+from alembic import context, op
+
+# revision identifiers, used by Alembic.
+revision: str = "c6e8a0b2d4f7"
+down_revision: str | None = "b5d7f9a1c3e6"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# Должно совпадать с ORDERS_PARTITION_MONTHS_AHEAD по умолчанию в app/maintenance.py
+months_ahead = 3
+
+columns = """
+    id integer NOT NULL DEFAULT nextval('orders_id_seq'),
+    customer_id integer NOT NULL,
+    equipment_id integer NOT NULL,
+    start_date timestamp with time zone NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    end_date timestamp with time zone NOT NULL,
+    total_price numeric(10, 2) NOT NULL DEFAULT 0
+"""
+column_names = "id, customer_id, equipment_id, start_date, end_date, total_price"
+
+
+def add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def exclusion(table: str, name: str) -> str:
+    return (
+        f"ALTER TABLE {table} ADD CONSTRAINT {name} EXCLUDE USING gist "
+        "(equipment_id WITH =, tstzrange(start_date, end_date) WITH &&)"
+    )
+
+
+def add_keys_and_indexes(primary_key: str) -> None:
+    op.execute(
+        f"ALTER TABLE orders ADD CONSTRAINT pk_orders PRIMARY KEY ({primary_key})"
+    )
+    op.execute(
+        "ALTER TABLE orders ADD CONSTRAINT fk_orders_customer_id_users "
+        "FOREIGN KEY (customer_id) REFERENCES users (id) ON DELETE RESTRICT"
+    )
+    op.execute(
+        "ALTER TABLE orders ADD CONSTRAINT fk_orders_equipment_id_equipment "
+        "FOREIGN KEY (equipment_id) REFERENCES equipment (id) ON DELETE RESTRICT"
+    )
+    op.create_index("ix_orders_customer_id_id", "orders", ["customer_id", "id"])
+    op.create_index("ix_orders_start_date_id", "orders", ["start_date", "id"])
+    op.create_index(
+        "ix_orders_equipment_id_start_date_end_date",
+        "orders",
+        ["equipment_id", "start_date", "end_date"],
+    )
+
+
+def replace_orders(new_table: str) -> None:
+    """Переносит данные в new_table и подменяет им orders, сохраняя sequence"""
+    op.execute(f"INSERT INTO {new_table} SELECT {column_names} FROM orders")
+    op.execute("ALTER SEQUENCE orders_id_seq OWNED BY NONE")
+    op.execute("DROP TABLE orders CASCADE")
+    op.execute(f"ALTER TABLE {new_table} RENAME TO orders")
+    op.execute("ALTER SEQUENCE orders_id_seq OWNED BY orders.id")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Таблица переписывается целиком под эксклюзивной блокировкой:
+    # на больших объемах миграцию нужно проводить в окно обслуживания.
+    op.execute("LOCK TABLE orders IN ACCESS EXCLUSIVE MODE")
+    current = datetime.now(UTC).date().replace(day=1)
+    first = current
+    if not context.is_offline_mode():
+        oldest = op.get_bind().scalar(sa.text("SELECT min(start_date) FROM orders"))
+        if oldest is not None:
+            first = min(first, oldest.astimezone(UTC).date().replace(day=1))
+
+    op.execute(
+        f"CREATE TABLE orders_partitioned ({columns}) PARTITION BY RANGE (start_date)"
+    )
+    op.execute("CREATE TABLE orders_default PARTITION OF orders_partitioned DEFAULT")
+    month = first
+    while month <= add_months(current, months_ahead):
+        name = f"orders_y{month.year}m{month.month:02d}"
+        op.execute(
+            f"CREATE TABLE {name} PARTITION OF orders_partitioned FOR VALUES "
+            f"FROM ('{month} 00:00:00+00') TO ('{add_months(month, 1)} 00:00:00+00')"
+        )
+        month = add_months(month, 1)
+
+    replace_orders("orders_partitioned")
+    # Первичный ключ секционированной таблицы обязан включать ключ секционирования.
+    # В модели ключ остается (id): id по-прежнему уникален благодаря sequence.
+    add_keys_and_indexes("id, start_date")
+
+    # Исключающее ограничение на секционированной таблице возможно только с
+    # равенством по ключу секционирования и не видело бы пересечений заказов из
+    # соседних месяцев. Поэтому периоды броней хранятся в несекционированной
+    # reservations, и ограничение действует на все заказы оборудования сразу.
+    op.create_table(
+        "reservations",
+        sa.Column("order_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("equipment_id", sa.Integer(), nullable=False),
+        sa.Column("start_date", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("end_date", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["equipment_id"],
+            ["equipment.id"],
+            name=op.f("fk_reservations_equipment_id_equipment"),
+            ondelete="RESTRICT",
+        ),
+        sa.PrimaryKeyConstraint("order_id", name=op.f("pk_reservations")),
+    )
+    op.execute(
+        "INSERT INTO reservations (order_id, equipment_id, start_date, end_date) "
+        "SELECT id, equipment_id, start_date, end_date FROM orders"
+    )
+    op.execute(exclusion("reservations", "ex_reservations_equipment_id_period"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Секции, перенесенные в архив, обратно не возвращаются
+    op.execute("LOCK TABLE orders IN ACCESS EXCLUSIVE MODE")
+    op.drop_table("reservations")
+    op.execute(f"CREATE TABLE orders_plain ({columns})")
+    replace_orders("orders_plain")
+    add_keys_and_indexes("id")
+    op.execute(exclusion("orders", "ex_orders_equipment_id_period"))
@@ -0,0 +1,56 @@
+"""equipment: indexes for price sort and filters
+
+Revision ID: d1f5b2c8e6a4
+Revises: c4e8a1f7d392
+Create Date: 2026-10-17 13:58:12.640519
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d1f5b2c8e6a4"
+down_revision: str | None = "c4e8a1f7d392"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# (имя, колонки)
+new_indexes = [
+    ("ix_equipment_price_per_day_id", ["price_per_day", "id"]),
+    (
+        "ix_equipment_category_id_price_per_day_id",
+        ["category_id", "price_per_day", "id"],
+    ),
+    (
+        "ix_equipment_is_available_price_per_day_id",
+        ["is_available", "price_per_day", "id"],
+    ),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, columns in new_indexes:
+            op.create_index(
+                name,
+                "equipment",
+                columns,
+                unique=False,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(new_indexes):
+            op.drop_index(
+                name,
+                table_name="equipment",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,40 @@
+"""categories: equipment_count counter
+
+Revision ID: e6a9c3d0f1b7
+Revises: d1f5b2c8e6a4
+Create Date: 2026-10-17 14:37:51.027384
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e6a9c3d0f1b7"
+down_revision: str | None = "d1f5b2c8e6a4"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "categories",
+        sa.Column("equipment_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.execute(
+        """
+        UPDATE categories SET equipment_count = (
+            SELECT count(*) FROM equipment
+            WHERE equipment.category_id = categories.id
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("categories", "equipment_count")
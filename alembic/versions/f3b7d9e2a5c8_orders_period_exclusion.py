@@ -0,0 +1,36 @@
+"""orders: exclusion constraint on overlapping reservation periods
+
+Revision ID: f3b7d9e2a5c8
+Revises: e6a9c3d0f1b7
+Create Date: 2026-10-17 15:46:03.318842
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f3b7d9e2a5c8"
+down_revision: str | None = "e6a9c3d0f1b7"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # btree_gist нужен для оператора = по integer в GiST-индексе. Если в таблице
+    # уже есть пересекающиеся заказы одного оборудования, миграция упадет:
+    # их нужно разрешить вручную до обновления.
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    op.execute(
+        """
+        ALTER TABLE orders ADD CONSTRAINT ex_orders_equipment_id_period
+        EXCLUDE USING gist (equipment_id WITH =, tstzrange(start_date, end_date) WITH &&)
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("ex_orders_equipment_id_period", "orders")
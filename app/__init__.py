@@ -1,20 +1,82 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
+from time import time
 
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
-from app.exceptions import handle_integrity_error, handle_sqlalchemy_error
-from app.routers import admin, auth, categories, equipment, orders, photos
+from app.database import (
+    Async_Local_Session,
+    engine,
+    replicas,
+    sticky_cookie,
+    sticky_seconds,
+)
+from app.exceptions import (
+    handle_idempotent_replay,
+    handle_integrity_error,
+    handle_sqlalchemy_error,
+)
+from app.idempotency import IdempotentReplay
+from app.maintenance import (
+    availability_interval,
+    partition_interval,
+    run_availability_refresh,
+    run_partition_maintenance,
+    run_sweeper,
+    sweep_interval,
+)
+from app.routers import admin, auth, categories, equipment, exports, orders, photos
 
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = []
+    if sweep_interval > 0:
+        tasks.append(asyncio.create_task(run_sweeper(Async_Local_Session)))
+    if replicas:
+        tasks.append(asyncio.create_task(replicas.run_health_checks()))
+    if availability_interval > 0:
+        tasks.append(asyncio.create_task(run_availability_refresh(Async_Local_Session)))
+    if partition_interval > 0 and engine.dialect.name == "postgresql":
+        tasks.append(
+            asyncio.create_task(run_partition_maintenance(Async_Local_Session))
+        )
+    yield
+    for task in tasks:
+        task.cancel()
+
+
 app: FastAPI = FastAPI(
     title="Project3",
     version="0.2.0",
     debug=os.getenv("DEBUG", "false").lower() == "true",
+    lifespan=lifespan,
 )
 
+
+@app.middleware("http")
+async def stick_to_primary_after_write(request: Request, call_next):
+    """После успешной записи некоторое время читаем с основной БД"""
+    response = await call_next(request)
+    if (
+        replicas
+        and request.method not in ("GET", "HEAD", "OPTIONS")
+        and response.status_code < 400
+    ):
+        response.set_cookie(
+            key=sticky_cookie,
+            value=str(time() + sticky_seconds),
+            max_age=sticky_seconds,
+            httponly=True,
+        )
+    return response
+
+
 app.include_router(auth.router, tags=["auth"])
 app.include_router(admin.router, prefix="/admin", tags=["admin"])
 app.include_router(categories.router, prefix="/categories", tags=["category"])
@@ -23,6 +85,8 @@ app.include_router(
     photos.router, prefix="/equipment/{equipment_id}/photos", tags=["equipment"]
 )
 app.include_router(orders.router, prefix="/orders", tags=["orders"])
+app.include_router(exports.router, prefix="/export", tags=["export"])
 
+app.add_exception_handler(IdempotentReplay, handle_idempotent_replay)
 app.add_exception_handler(IntegrityError, handle_integrity_error)
 app.add_exception_handler(SQLAlchemyError, handle_sqlalchemy_error)
@@ -0,0 +1,118 @@
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable
+from datetime import UTC, datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import calendar_cache
+from app.models import Reservation
+
+Interval = tuple[datetime, datetime]
+
+
+def as_utc(moment: datetime) -> datetime:
+    # SQLite и даты без часового пояса во входных данных считаем UTC
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=UTC)
+    return moment.astimezone(UTC)
+
+
+class IntervalIndex:
+    """Брони одного оборудования, отсортированные по началу.
+
+    Брони не пересекаются (ограничение ex_reservations_equipment_id_period), поэтому
+    концы отсортированы так же, как начала, и первая бронь, задевающая период,
+    находится бинарным поиском по концам.
+    """
+
+    def __init__(self, intervals: Iterable[Interval] = ()) -> None:
+        self.intervals: list[Interval] = sorted(
+            (as_utc(start), as_utc(end)) for start, end in intervals
+        )
+        self.ends = [end for _, end in self.intervals]
+
+    def add(self, start: datetime, end: datetime) -> None:
+        interval = (as_utc(start), as_utc(end))
+        position = bisect_left(self.intervals, interval)
+        self.intervals.insert(position, interval)
+        self.ends.insert(position, interval[1])
+
+    def remove(self, start: datetime, end: datetime) -> None:
+        interval = (as_utc(start), as_utc(end))
+        position = bisect_left(self.intervals, interval)
+        if position < len(self.intervals) and self.intervals[position] == interval:
+            del self.intervals[position]
+            del self.ends[position]
+
+    def busy(self, start: datetime, end: datetime) -> list[Interval]:
+        """Брони, пересекающиеся с [start, end), обрезанные по границам периода"""
+        start, end = as_utc(start), as_utc(end)
+        result = []
+        for busy_start, busy_end in self.intervals[bisect_right(self.ends, start) :]:
+            if busy_start >= end:
+                break
+            result.append((max(busy_start, start), min(busy_end, end)))
+        return result
+
+    def free(self, start: datetime, end: datetime) -> list[Interval]:
+        start, end = as_utc(start), as_utc(end)
+        result = []
+        cursor = start
+        for busy_start, busy_end in self.busy(start, end):
+            if busy_start > cursor:
+                result.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        if cursor < end:
+            result.append((cursor, end))
+        return result
+
+
+# Построения календаря, идущие в этом процессе: equipment_id -> [число
+# построений, счетчик изменений броней]. Запись живет, пока идет построение
+build_versions: dict[int, list[int]] = {}
+
+
+async def build_calendar(session: AsyncSession, equipment_id: int) -> IntervalIndex:
+    """Строит индекс броней одним запросом к reservations и кэширует.
+
+    Сессия должна читать основную БД. Если пока шел запрос бронь добавили или
+    удалили, индекс мог ее не увидеть, и он возвращается без кэширования.
+    """
+    entry = build_versions.setdefault(equipment_id, [0, 0])
+    entry[0] += 1
+    version = entry[1]
+    try:
+        rows = await session.execute(
+            select(Reservation.start_date, Reservation.end_date).where(
+                Reservation.equipment_id == equipment_id
+            )
+        )
+        calendar = IntervalIndex(rows.tuples())
+        if entry[1] == version:
+            calendar_cache.set(equipment_id, calendar)
+    finally:
+        entry[0] -= 1
+        if not entry[0]:
+            del build_versions[equipment_id]
+    return calendar
+
+
+def booking_changed(equipment_id: int) -> None:
+    entry = build_versions.get(equipment_id)
+    if entry is not None:
+        entry[1] += 1
+
+
+def booking_added(equipment_id: int, start: datetime, end: datetime) -> None:
+    booking_changed(equipment_id)
+    calendar = calendar_cache.get(equipment_id)
+    if calendar is not None:
+        calendar.add(start, end)
+
+
+def booking_removed(equipment_id: int, start: datetime, end: datetime) -> None:
+    booking_changed(equipment_id)
+    calendar = calendar_cache.get(equipment_id)
+    if calendar is not None:
+        calendar.remove(start, end)
@@ -1,8 +1,17 @@
+import asyncio
 import os
 from collections.abc import AsyncGenerator
+from itertools import count
+from time import perf_counter, time
+from uuid import uuid4
 
 from dotenv import load_dotenv
+from fastapi import Depends, Request
+from sqlalchemy import make_url, text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.metrics import LatencyStats
 
 load_dotenv()
 
@@ -10,10 +19,140 @@ database_url = os.getenv("DATABASE_URL")
 if not database_url:
     raise RuntimeError("DATABASE_URL is not found")
 
-engine = create_async_engine(database_url, echo=True)
+
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() == "true"
+
+
+pool_checkout = LatencyStats()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, замеряющий время ожидания свободного соединения"""
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout.observe(perf_counter() - start)
+
+
+def engine_options(url: str) -> dict:
+    options: dict = {"echo": env_flag("DB_ECHO")}
+    if make_url(url).get_backend_name() != "postgresql":
+        return options
+    connect_args: dict = {
+        "statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100)),
+        "prepared_statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100)),
+    }
+    # PgBouncer в режиме transaction pooling не сохраняет подготовленные
+    # выражения между транзакциями: отключаем кэши и даем уникальные имена.
+    if env_flag("DB_PGBOUNCER"):
+        connect_args |= {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return options | {
+        "poolclass": TimedQueuePool,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_pre_ping": env_flag("DB_POOL_PRE_PING", "true"),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "connect_args": connect_args,
+    }
+
+
+engine = create_async_engine(database_url, **engine_options(database_url))
 Async_Local_Session = async_sessionmaker(bind=engine, expire_on_commit=False)
 
 
 async def get_session() -> AsyncGenerator[AsyncSession]:
     async with Async_Local_Session() as session:
         yield session
+
+
+def get_session_maker() -> async_sessionmaker[AsyncSession]:
+    """Фабрика сессий для ответов, которые продолжают читать БД после выхода из
+    обработчика (StreamingResponse): сессия из get_session к тому моменту закрыта
+    """
+    return Async_Local_Session
+
+
+# Cookie, пока действует которая, чтение идет с основной БД (read-your-writes)
+sticky_cookie = "read_primary_until"
+sticky_seconds = int(os.getenv("READ_STICKY_SECONDS", 5))
+replica_health_interval = float(os.getenv("REPLICA_HEALTH_INTERVAL", 10))
+
+
+class ReplicaSet:
+    """Реплики для чтения с round-robin и отключением недоступных"""
+
+    def __init__(self, urls: list[str]) -> None:
+        self.engines = [create_async_engine(url, **engine_options(url)) for url in urls]
+        self.session_makers = [
+            async_sessionmaker(bind=replica, expire_on_commit=False)
+            for replica in self.engines
+        ]
+        self.healthy = [True] * len(self.engines)
+        self._counter = count()
+
+    def __bool__(self) -> bool:
+        return bool(self.engines)
+
+    def pick(self) -> async_sessionmaker[AsyncSession] | None:
+        for _ in range(len(self.engines)):
+            index = next(self._counter) % len(self.engines)
+            if self.healthy[index]:
+                return self.session_makers[index]
+        return None
+
+    async def check(self) -> None:
+        for index, replica in enumerate(self.engines):
+            try:
+                async with asyncio.timeout(replica_health_interval):
+                    async with replica.connect() as conn:
+                        await conn.execute(text("SELECT 1"))
+                self.healthy[index] = True
+            except Exception:
+                self.healthy[index] = False
+
+    async def run_health_checks(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(replica_health_interval)
+
+
+replicas = ReplicaSet(
+    [url for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+)
+
+
+def sticky_to_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(sticky_cookie, 0)) > time()
+    except ValueError:
+        return False
+
+
+async def get_read_session(
+    request: Request, primary: AsyncSession = Depends(get_session)
+) -> AsyncGenerator[AsyncSession]:
+    """Сессия для чтения: реплика, если она есть и пользователь недавно не писал"""
+    session_maker = None if sticky_to_primary(request) else replicas.pick()
+    if session_maker is None:
+        yield primary
+        return
+    async with session_maker() as session:
+        yield session
+
+
+def get_read_session_maker(
+    request: Request,
+    primary: async_sessionmaker[AsyncSession] = Depends(get_session_maker),
+) -> async_sessionmaker[AsyncSession]:
+    if sticky_to_primary(request):
+        return primary
+    return replicas.pick() or primary
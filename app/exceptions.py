@@ -1,5 +1,7 @@
 from fastapi import Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+
+from app.idempotency import IdempotentReplay
 
 
 async def handle_integrity_error(request: Request, exc: Exception):
@@ -14,3 +16,12 @@ async def handle_sqlalchemy_error(request: Request, exc: Exception):
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"detail": "Ошибка сервера"},
     )
+
+
+async def handle_idempotent_replay(request: Request, exc: IdempotentReplay):
+    return Response(
+        content=exc.record.body,
+        status_code=exc.record.status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+import os
+from collections.abc import AsyncIterator
+from typing import Literal
+
+from dotenv import load_dotenv
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+load_dotenv()
+
+export_batch_size = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+ExportFormat = Literal["ndjson", "csv"]
+
+media_types = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+async def export_rows(
+    session_maker: async_sessionmaker[AsyncSession],
+    stmt: Select,
+    schema: type[BaseModel],
+    export_format: ExportFormat,
+) -> AsyncIterator[str]:
+    """Читает строки курсором на стороне сервера и отдает их пачками.
+
+    В памяти одновременно находится не больше export_batch_size строк,
+    независимо от размера выгрузки.
+    """
+    fields = list(schema.model_fields)
+    async with session_maker() as session:
+        result = await session.stream_scalars(
+            stmt.execution_options(yield_per=export_batch_size)
+        )
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=fields)
+            writer.writeheader()
+            yield buffer.getvalue()
+        async for batch in result.partitions():
+            rows = [schema.model_validate(row).model_dump(mode="json") for row in batch]
+            if export_format == "csv":
+                buffer = io.StringIO()
+                csv.DictWriter(buffer, fieldnames=fields).writerows(rows)
+                yield buffer.getvalue()
+            else:
+                yield "".join(
+                    json.dumps(row, ensure_ascii=False) + "\n" for row in rows
+                )
+
+
+def export_response(
+    session_maker: async_sessionmaker[AsyncSession],
+    stmt: Select,
+    schema: type[BaseModel],
+    export_format: ExportFormat,
+    filename: str,
+) -> StreamingResponse:
+    return StreamingResponse(
+        export_rows(session_maker, stmt, schema, export_format),
+        media_type=media_types[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{export_format}"'
+        },
+    )
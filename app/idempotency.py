@@ -0,0 +1,153 @@
+import hashlib
+import os
+from datetime import UTC, datetime, timedelta
+
+from dotenv import load_dotenv
+from fastapi import Depends, Header, HTTPException, Request, status
+from pydantic import BaseModel
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import UploadFile
+
+from app.database import get_session
+from app.models import IdempotencyKey, User
+from app.supfunctions import get_current_user
+
+load_dotenv()
+
+idempotency_key_ttl = int(os.getenv("IDEMPOTENCY_KEY_TTL", 86400))
+
+
+class IdempotentReplay(Exception):
+    """Запрос с этим ключом уже выполнен: вместо обработчика отдается
+    сохраненный ответ (см. handle_idempotent_replay)
+    """
+
+    def __init__(self, record: IdempotencyKey) -> None:
+        self.record = record
+
+
+async def request_hash(request: Request) -> str:
+    """Отпечаток запроса: метод, путь, параметры и тело.
+
+    Тело multipart уже разобрано FastAPI и повторно не читается, поэтому
+    хешируются поля формы и содержимое файлов.
+    """
+    digest = hashlib.sha256(
+        f"{request.method} {request.url.path}?{request.url.query}\n".encode()
+    )
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        for name, value in (await request.form()).multi_items():
+            digest.update(name.encode())
+            if isinstance(value, UploadFile):
+                digest.update((value.filename or "").encode())
+                upload = value.file
+                upload.seek(0)
+                while chunk := upload.read(8192):
+                    digest.update(chunk)
+                upload.seek(0)
+            else:
+                digest.update(value.encode())
+    else:
+        digest.update(await request.body())
+    return digest.hexdigest()
+
+
+async def replay_stored(
+    session: AsyncSession, user_id: int, key: str, fingerprint: str
+) -> None:
+    """Отдает сохраненный ответ, если запрос с этим ключом уже выполнен"""
+    record = await session.scalar(
+        select(IdempotencyKey).where(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == key,
+            IdempotencyKey.expires_at > datetime.now(UTC),
+        )
+    )
+    if record is None:
+        return
+    if record.request_hash != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Ключ идемпотентности уже использован с другим запросом",
+        )
+    raise IdempotentReplay(record)
+
+
+class Idempotency:
+    """Ключ идемпотентности текущего запроса.
+
+    Ответ сохраняется в той же транзакции, что и сама запись, поэтому после
+    отката ключ не остается, а после коммита повтор не выполнит запись дважды.
+    """
+
+    def __init__(
+        self, session: AsyncSession, user_id: int, key: str | None, request_hash: str
+    ) -> None:
+        self.session = session
+        self.user_id = user_id
+        self.key = key
+        self.request_hash = request_hash
+
+    async def save(self, response: BaseModel, status_code: int) -> None:
+        """Вызывается обработчиком перед коммитом"""
+        if self.key is None:
+            return
+        now = datetime.now(UTC)
+        key_filter = (
+            IdempotencyKey.user_id == self.user_id,
+            IdempotencyKey.key == self.key,
+        )
+        try:
+            await self.session.execute(
+                delete(IdempotencyKey).where(
+                    *key_filter, IdempotencyKey.expires_at <= now
+                )
+            )
+            await self.session.execute(
+                insert(IdempotencyKey).values(
+                    user_id=self.user_id,
+                    key=self.key,
+                    request_hash=self.request_hash,
+                    status_code=status_code,
+                    body=response.model_dump_json().encode(),
+                    expires_at=now + timedelta(seconds=idempotency_key_ttl),
+                )
+            )
+        except IntegrityError:
+            # Параллельный запрос с тем же ключом успел сохранить свой ответ.
+            # В PostgreSQL до этого не доходит: ключ заблокирован в get_idempotency
+            await self.session.rollback()
+            await replay_stored(self.session, self.user_id, self.key, self.request_hash)
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Запрос с этим ключом идемпотентности уже выполняется",
+                headers={"Retry-After": "1"},
+            ) from None
+
+
+async def get_idempotency(
+    request: Request,
+    key: str | None = Header(
+        None,
+        alias="Idempotency-Key",
+        max_length=255,
+        description="Ключ идемпотентности: повтор запроса с тем же ключом возвращает первый ответ",
+    ),
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+) -> Idempotency:
+    if key is None:
+        return Idempotency(session, user.id, None, "")
+    fingerprint = await request_hash(request)
+    if session.get_bind().dialect.name == "postgresql":
+        # Ключ занят до конца транзакции обработчика: повтор, пришедший пока
+        # первый запрос еще выполняется, дождется его коммита и получит
+        # сохраненный ответ, а не выполнит запись второй раз
+        await session.execute(
+            text("SELECT pg_advisory_xact_lock(:user_id, hashtext(:key))"),
+            {"user_id": user.id, "key": key},
+        )
+    await replay_stored(session, user.id, key, fingerprint)
+    return Idempotency(session, user.id, key, fingerprint)
@@ -0,0 +1,200 @@
+import codecs
+import csv
+import json
+import os
+from collections import Counter
+from collections.abc import AsyncIterator
+from typing import Literal
+
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Category, Equipment
+from app.schemas import EquipmentCreate, ImportResult, ImportRowError
+from app.supfunctions import change_equipment_count
+
+load_dotenv()
+
+import_batch_size = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+
+ImportFormat = Literal["ndjson", "csv"]
+
+
+async def read_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Разбивает поток байтов на строки, не дожидаясь конца тела запроса"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    tail = ""
+    async for chunk in chunks:
+        *lines, tail = (tail + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail.rstrip("\r")
+
+
+async def read_records(
+    lines: AsyncIterator[str], import_format: ImportFormat
+) -> AsyncIterator[tuple[int, dict | None, str | None]]:
+    """Отдает (номер строки данных, запись, ошибка разбора)"""
+    number = 0
+    header = None
+    pending = ""
+    async for line in lines:
+        if import_format == "csv":
+            # Поле в кавычках может содержать перевод строки
+            pending = f"{pending}\n{line}" if pending else line
+            if pending.count('"') % 2:
+                continue
+            line, pending = pending, ""
+        if not line.strip():
+            continue
+        if import_format == "csv" and header is None:
+            header = next(csv.reader([line]))
+            continue
+        number += 1
+        if import_format == "csv":
+            values = next(csv.reader([line]))
+            if len(values) != len(header):
+                yield number, None, "Количество полей не совпадает с заголовком"
+                continue
+            yield number, dict(zip(header, values, strict=True)), None
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            yield number, None, "Некорректный JSON"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "Строка должна быть JSON-объектом"
+            continue
+        yield number, record, None
+    if pending:
+        yield number + 1, None, "Незакрытые кавычки в конце файла"
+
+
+def validation_detail(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}"
+        for item in error.errors()
+    )
+
+
+class EquipmentImport:
+    """Построчная проверка и вставка оборудования пачками по import_batch_size.
+
+    Каждая пачка - отдельная транзакция: INSERT ... ON CONFLICT (title) DO NOTHING
+    RETURNING, поэтому дубликаты наименований отбрасываются БД без отката пачки,
+    а в отчет попадают строки, которые не вернулись из RETURNING. Если БД все же
+    отклонила пачку, строки вставляются по одной, и в отчет попадают только
+    отклоненные.
+    """
+
+    def __init__(self, session: AsyncSession, owner_id: int) -> None:
+        self.session = session
+        self.owner_id = owner_id
+        self.known_categories: set[int] = set()
+        self.missing_categories: set[int] = set()
+        self.result = ImportResult(inserted=0, failed=0, errors=[])
+
+    def fail(self, number: int, detail: str) -> None:
+        self.result.failed += 1
+        self.result.errors.append(ImportRowError(row=number, detail=detail))
+
+    async def run(
+        self, records: AsyncIterator[tuple[int, dict | None, str | None]]
+    ) -> ImportResult:
+        batch: list[tuple[int, EquipmentCreate]] = []
+        async for number, record, error in records:
+            if error:
+                self.fail(number, error)
+                continue
+            try:
+                batch.append((number, EquipmentCreate.model_validate(record)))
+            except ValidationError as exc:
+                self.fail(number, validation_detail(exc))
+                continue
+            if len(batch) >= import_batch_size:
+                await self.insert_batch(batch)
+                batch = []
+        if batch:
+            await self.insert_batch(batch)
+        self.result.errors.sort(key=lambda item: item.row)
+        return self.result
+
+    async def check_categories(self, category_ids: set[int]) -> None:
+        unknown = category_ids - self.known_categories - self.missing_categories
+        if not unknown:
+            return
+        found = set(
+            await self.session.scalars(
+                select(Category.id).where(Category.id.in_(unknown))
+            )
+        )
+        self.known_categories |= found
+        self.missing_categories |= unknown - found
+
+    async def insert_batch(self, batch: list[tuple[int, EquipmentCreate]]) -> None:
+        await self.check_categories({row.category_id for _, row in batch})
+        rows: dict[str, tuple[int, EquipmentCreate]] = {}
+        for number, row in batch:
+            if row.category_id in self.missing_categories:
+                self.fail(number, "Категория не найдена")
+            elif row.title in rows:
+                self.fail(number, "Наименование повторяется в загружаемых данных")
+            else:
+                rows[row.title] = (number, row)
+        if not rows:
+            return
+
+        try:
+            inserted = await self.insert_rows(list(rows.values()))
+        except DBAPIError:
+            # Строка, отклоненная БД (например, категорию удалили после проверки),
+            # отменяет весь INSERT пачки: повторяем построчно в SAVEPOINT'ах
+            await self.session.rollback()
+            inserted = []
+            for title, (number, row) in list(rows.items()):
+                try:
+                    async with self.session.begin_nested():
+                        inserted += await self.insert_rows([(number, row)])
+                except DBAPIError:
+                    del rows[title]
+                    self.fail(number, "Строка отклонена БД")
+        try:
+            for category_id, count in Counter(
+                category_id for _, category_id in inserted
+            ).items():
+                await self.session.execute(change_equipment_count(category_id, count))
+            await self.session.commit()
+        except:
+            await self.session.rollback()
+            raise
+        self.result.inserted += len(inserted)
+        inserted_titles = {title for title, _ in inserted}
+        for title, (number, _) in rows.items():
+            if title not in inserted_titles:
+                self.fail(number, "Оборудование с таким наименованием уже существует")
+
+    async def insert_rows(
+        self, rows: list[tuple[int, EquipmentCreate]]
+    ) -> list[tuple[str, int]]:
+        """INSERT ... ON CONFLICT (title) DO NOTHING, возвращает (title, category_id)
+        вставленных строк
+        """
+        dialect = (
+            postgresql
+            if self.session.get_bind().dialect.name == "postgresql"
+            else sqlite
+        )
+        stmt = (
+            dialect.insert(Equipment)
+            .values([row.model_dump() | {"owner_id": self.owner_id} for _, row in rows])
+            .on_conflict_do_nothing(index_elements=[Equipment.title])
+            .returning(Equipment.title, Equipment.category_id)
+        )
+        return [tuple(row) for row in await self.session.execute(stmt)]
@@ -0,0 +1,327 @@
+import argparse
+import asyncio
+import logging
+import os
+import re
+from datetime import UTC, date, datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, exists, select, text, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.sql.elements import Tuple
+
+from app import tokens
+from app.models import Equipment, IdempotencyKey, Order, RevokedToken, Session
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+sweep_interval = float(os.getenv("SESSION_SWEEP_INTERVAL", 300))
+sweep_batch_size = int(os.getenv("SESSION_SWEEP_BATCH_SIZE", 1000))
+
+availability_interval = float(os.getenv("AVAILABILITY_REFRESH_INTERVAL", 60))
+
+partition_interval = float(os.getenv("ORDERS_PARTITION_INTERVAL", 86400))
+partition_months_ahead = int(os.getenv("ORDERS_PARTITION_MONTHS_AHEAD", 3))
+archive_after_months = int(os.getenv("ORDERS_ARCHIVE_AFTER_MONTHS", 24))
+archive_schema = os.getenv("ORDERS_ARCHIVE_SCHEMA", "archive")
+
+
+async def delete_in_batches(
+    session_maker: async_sessionmaker[AsyncSession], model, key, condition
+) -> int:
+    """Удаляет строки пачками по sweep_batch_size, каждая пачка - своя транзакция.
+
+    Строки, заблокированные другими транзакциями, пропускаются (SKIP LOCKED),
+    поэтому уборка не ждет чужих блокировок и не держит свои надолго.
+    key - первичный ключ, для составного ключа - tuple_ из его колонок.
+    """
+    columns = key.clauses if isinstance(key, Tuple) else [key]
+    deleted = 0
+    while True:
+        batch = (
+            select(*columns)
+            .where(condition)
+            .limit(sweep_batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        async with session_maker() as session:
+            result = await session.execute(
+                delete(model)
+                .where(key.in_(batch))
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        deleted += result.rowcount
+        if result.rowcount < sweep_batch_size:
+            return deleted
+        await asyncio.sleep(0)
+
+
+async def sweep_expired(session_maker: async_sessionmaker[AsyncSession]) -> int:
+    now = datetime.now(UTC)
+    deleted = await delete_in_batches(
+        session_maker,
+        Session,
+        Session.id,
+        Session.created_at <= now - timedelta(seconds=tokens.session_ttl),
+    )
+    deleted += await delete_in_batches(
+        session_maker, RevokedToken, RevokedToken.jti, RevokedToken.expires_at <= now
+    )
+    deleted += await delete_in_batches(
+        session_maker,
+        IdempotencyKey,
+        tuple_(IdempotencyKey.user_id, IdempotencyKey.key),
+        IdempotencyKey.expires_at <= now,
+    )
+    return deleted
+
+
+async def run_sweeper(session_maker: async_sessionmaker[AsyncSession]) -> None:
+    while True:
+        try:
+            await sweep_expired(session_maker)
+        except Exception:
+            logger.exception("Ошибка при удалении истекших сессий")
+        await asyncio.sleep(sweep_interval)
+
+
+# Ключ advisory-блокировки: доступность пересчитывает один процесс за раз
+availability_lock_key = 7_301_202_302
+
+
+async def refresh_availability(
+    session_maker: async_sessionmaker[AsyncSession], since: datetime | None = None
+) -> datetime:
+    """Пересчитывает Equipment.is_available по заказам, идущим сейчас.
+
+    make_order и delete_order меняют флаг сразу, но только для заказа, который
+    уже идет. Здесь флаг снимается, когда начинается будущая бронь, и
+    возвращается, когда аренда заканчивается. С since проверяется только
+    оборудование, чьи заказы начались или закончились после since, без него -
+    все оборудование. Возвращает момент пересчета для следующего вызова.
+    """
+    now = datetime.now(UTC)
+    active = exists().where(
+        Order.equipment_id == Equipment.id,
+        Order.start_date <= now,
+        Order.end_date > now,
+    )
+    started = active
+    ended = ~active
+    if since is not None:
+        started = Equipment.id.in_(
+            select(Order.equipment_id).where(
+                Order.start_date > since,
+                Order.start_date <= now,
+                Order.end_date > now,
+            )
+        )
+        ended = ~active & exists().where(
+            Order.equipment_id == Equipment.id,
+            Order.end_date > since,
+            Order.end_date <= now,
+        )
+    async with session_maker() as session:
+        if session.get_bind().dialect.name == "postgresql":
+            await session.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"),
+                {"key": availability_lock_key},
+            )
+        await session.execute(
+            update(Equipment)
+            .where(Equipment.is_available, started)
+            .values(is_available=False)
+            .execution_options(synchronize_session=False)
+        )
+        await session.execute(
+            update(Equipment)
+            .where(~Equipment.is_available, ended)
+            .values(is_available=True)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+    return now
+
+
+async def run_availability_refresh(
+    session_maker: async_sessionmaker[AsyncSession],
+) -> None:
+    since = None
+    while True:
+        try:
+            since = await refresh_availability(session_maker, since)
+        except Exception:
+            logger.exception("Ошибка при пересчете доступности оборудования")
+        await asyncio.sleep(availability_interval)
+
+
+# Секционирование orders по месяцам (только PostgreSQL, см. миграцию c6e8a0b2d4f7)
+partition_pattern = re.compile(r"^orders_y(\d{4})m(\d{2})$")
+# Ключ advisory-блокировки: секциями одновременно управляет один процесс
+partition_lock_key = 7_301_202_301
+
+
+def add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"orders_y{month.year}m{month.month:02d}"
+
+
+async def orders_partitioned(session: AsyncSession) -> bool:
+    if session.get_bind().dialect.name != "postgresql":
+        return False
+    return bool(
+        await session.scalar(
+            text(
+                "SELECT 1 FROM pg_partitioned_table"
+                " WHERE partrelid = to_regclass('orders')"
+            )
+        )
+    )
+
+
+async def order_partitions(session: AsyncSession) -> list[tuple[date, str]]:
+    names = await session.scalars(
+        text(
+            "SELECT child.relname FROM pg_inherits"
+            " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+            " WHERE pg_inherits.inhparent = to_regclass('orders')"
+        )
+    )
+    partitions = []
+    for name in names:
+        match = partition_pattern.match(name)
+        if match:
+            partitions.append((date(int(match[1]), int(match[2]), 1), name))
+    return sorted(partitions)
+
+
+async def create_order_partition(session: AsyncSession, month: date) -> str:
+    """Создает секцию месяца и переносит в нее строки из секции по умолчанию.
+
+    Таблица создается отдельно и присоединяется через ATTACH PARTITION: так
+    заказы, попавшие в orders_default до появления секции, не мешают ее создать.
+    orders_default блокируется от вставок до конца транзакции, иначе заказ на
+    этот месяц, вставленный между переносом и ATTACH, сорвал бы присоединение.
+    """
+    name = partition_name(month)
+    bounds = {
+        "start": datetime.combine(month, datetime.min.time(), UTC),
+        "end": datetime.combine(add_months(month, 1), datetime.min.time(), UTC),
+    }
+    await session.execute(text("LOCK TABLE orders_default IN SHARE ROW EXCLUSIVE MODE"))
+    await session.execute(text(f"CREATE TABLE {name} (LIKE orders INCLUDING DEFAULTS)"))
+    await session.execute(
+        text(
+            f"WITH moved AS (DELETE FROM orders_default"
+            f" WHERE start_date >= :start AND start_date < :end RETURNING *)"
+            f" INSERT INTO {name} SELECT * FROM moved"
+        ),
+        bounds,
+    )
+    await session.execute(
+        text(
+            f"ALTER TABLE orders ATTACH PARTITION {name} FOR VALUES"
+            f" FROM ('{bounds['start'].isoformat()}') TO ('{bounds['end'].isoformat()}')"
+        )
+    )
+    return name
+
+
+async def ensure_order_partitions(
+    session_maker: async_sessionmaker[AsyncSession],
+    months_ahead: int = partition_months_ahead,
+) -> list[str]:
+    """Создает недостающие секции от текущего месяца на months_ahead вперед"""
+    async with session_maker() as session:
+        if not await orders_partitioned(session):
+            return []
+        await session.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": partition_lock_key}
+        )
+        existing = {month for month, _ in await order_partitions(session)}
+        current = datetime.now(UTC).date().replace(day=1)
+        created = []
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if month not in existing:
+                created.append(await create_order_partition(session, month))
+        await session.commit()
+    return created
+
+
+async def archive_order_partitions(
+    session_maker: async_sessionmaker[AsyncSession],
+    older_than_months: int = archive_after_months,
+) -> list[str]:
+    """Отсоединяет секции старше older_than_months месяцев и переносит их в
+    схему archive_schema. Данные остаются в БД, но запросы к orders их не видят.
+    Брони архивных заказов удаляются из reservations.
+    """
+    cutoff = add_months(datetime.now(UTC).date().replace(day=1), -older_than_months)
+    archived = []
+    async with session_maker() as session:
+        if not await orders_partitioned(session):
+            return []
+        await session.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+        await session.commit()
+        for month, name in await order_partitions(session):
+            if add_months(month, 1) > cutoff:
+                break
+            # DETACH CONCURRENTLY несовместим с секцией по умолчанию, поэтому
+            # обычный DETACH, но без долгого ожидания блокировки orders
+            await session.execute(text("SET LOCAL lock_timeout = '5s'"))
+            await session.execute(
+                text(
+                    "DELETE FROM reservations"
+                    f" WHERE order_id IN (SELECT id FROM {name})"
+                )
+            )
+            await session.execute(text(f"ALTER TABLE orders DETACH PARTITION {name}"))
+            await session.execute(
+                text(f"ALTER TABLE {name} SET SCHEMA {archive_schema}")
+            )
+            await session.commit()
+            archived.append(name)
+    return archived
+
+
+async def run_partition_maintenance(
+    session_maker: async_sessionmaker[AsyncSession],
+) -> None:
+    while True:
+        try:
+            await ensure_order_partitions(session_maker)
+        except Exception:
+            logger.exception("Ошибка при создании секций orders")
+        await asyncio.sleep(partition_interval)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Обслуживание секций orders")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ensure = commands.add_parser("partitions", help="Создать будущие секции")
+    ensure.add_argument("--months-ahead", type=int, default=partition_months_ahead)
+    archive = commands.add_parser("archive", help="Перенести старые секции в архив")
+    archive.add_argument("--older-than", type=int, default=archive_after_months)
+    args = parser.parse_args()
+
+    from app.database import Async_Local_Session, engine
+
+    if args.command == "partitions":
+        names = await ensure_order_partitions(Async_Local_Session, args.months_ahead)
+        print("created: " + (", ".join(names) or "nothing"))
+    else:
+        names = await archive_order_partitions(Async_Local_Session, args.older_than)
+        print(f"archived to {archive_schema}: " + (", ".join(names) or "nothing"))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,34 @@
+from bisect import bisect_left
+
+
+class LatencyStats:
+    """Счетчик длительностей с гистограммой по фиксированным границам (мс)"""
+
+    buckets = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram = [0] * (len(self.buckets) + 1)
+
+    def observe(self, seconds: float) -> None:
+        ms = seconds * 1000
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.histogram[bisect_left(self.buckets, ms)] += 1
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "histogram_ms": {
+                **{
+                    f"le_{b}": n
+                    for b, n in zip(self.buckets, self.histogram, strict=False)
+                },
+                "inf": self.histogram[-1],
+            },
+        }
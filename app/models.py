@@ -3,16 +3,23 @@ from decimal import Decimal
 
 from sqlalchemy import (
     Boolean,
+    Computed,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     LargeBinary,
     MetaData,
     Numeric,
     String,
+    column,
+    func,
     text,
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR, ExcludeConstraint
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.schema import CreateColumn
 
 naming_convention = {
     "pk": "pk_%(table_name)s",
@@ -23,6 +30,16 @@ naming_convention = {
 }
 
 
+@compiles(CreateColumn)
+def skip_postgresql_only_columns(element, compiler, **kw):
+    """Колонки с info={"postgresql_only": True} не создаются в других СУБД"""
+    if element.element.info.get("postgresql_only") and compiler.dialect.name != (
+        "postgresql"
+    ):
+        return None
+    return compiler.visit_create_column(element, **kw)
+
+
 class Base(DeclarativeBase):
     metadata = MetaData(naming_convention=naming_convention)
 
@@ -45,30 +62,77 @@ class User(Base):
 
 class Equipment(Base):
     __tablename__ = "equipment"
+    # Индексы под сортировки sortdict с id в качестве tiebreaker'а, в том числе
+    # при фильтре по категории. Одиночные индексы по is_available, owner_id и
+    # category_id не нужны: их покрывают составные индексы с тем же префиксом.
+    __table_args__ = (
+        Index("ix_equipment_title_id", "title", "id"),
+        Index("ix_equipment_is_available_id", "is_available", "id"),
+        Index("ix_equipment_owner_id_id", "owner_id", "id"),
+        Index("ix_equipment_category_id_id", "category_id", "id"),
+        Index("ix_equipment_category_id_title_id", "category_id", "title", "id"),
+        Index(
+            "ix_equipment_category_id_is_available_id",
+            "category_id",
+            "is_available",
+            "id",
+        ),
+        Index("ix_equipment_category_id_owner_id_id", "category_id", "owner_id", "id"),
+        Index("ix_equipment_price_per_day_id", "price_per_day", "id"),
+        Index(
+            "ix_equipment_category_id_price_per_day_id",
+            "category_id",
+            "price_per_day",
+            "id",
+        ),
+        # Самый частый фильтр: доступное оборудование в диапазоне цен
+        Index(
+            "ix_equipment_is_available_price_per_day_id",
+            "is_available",
+            "price_per_day",
+            "id",
+        ),
+        # Поиск (только PostgreSQL, нужно расширение pg_trgm)
+        Index(
+            "ix_equipment_search_vector", "search_vector", postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_equipment_title_trgm",
+            "title",
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     title: Mapped[str] = mapped_column(String(200), nullable=False, unique=True)
     description: Mapped[str] = mapped_column(String(1000), nullable=False)
     price_per_day: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
     is_available: Mapped[bool] = mapped_column(
-        Boolean, nullable=False, default=True, server_default=text("true"), index=True
+        Boolean, nullable=False, default=True, server_default=text("true")
     )
     owner_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("users.id", ondelete="RESTRICT"), nullable=False, index=True
+        Integer, ForeignKey("users.id", ondelete="RESTRICT"), nullable=False
     )
     category_id: Mapped[int] = mapped_column(
-        Integer,
-        ForeignKey("categories.id", ondelete="RESTRICT"),
-        nullable=False,
-        index=True,
+        Integer, ForeignKey("categories.id", ondelete="RESTRICT"), nullable=False
+    )
+    # Вычисляется самой БД, в ответы не попадает (deferred)
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('russian', coalesce(title, '')), 'A')"
+            " || setweight(to_tsvector('russian', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+        deferred=True,
+        info={"postgresql_only": True},
     )
 
     owner: Mapped[User] = relationship("User", back_populates="own_equipment")
     photos: Mapped[list["Photo"]] = relationship("Photo", back_populates="equipment")
     category: Mapped["Category"] = relationship("Category", back_populates="equipment")
-    order: Mapped["Order"] = relationship(
-        "Order", back_populates="equipment", uselist=False
-    )
+    orders: Mapped[list["Order"]] = relationship("Order", back_populates="equipment")
 
 
 class Photo(Base):
@@ -89,9 +153,14 @@ class Photo(Base):
 
 class Category(Base):
     __tablename__ = "categories"
+    __table_args__ = (Index("ix_categories_title_id", "title", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     title: Mapped[str] = mapped_column(String(100), nullable=False, unique=True)
+    # Поддерживается приложением при добавлении, переносе и удалении оборудования
+    equipment_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
 
     equipment: Mapped[list[Equipment]] = relationship(
         "Equipment", back_populates="category"
@@ -99,11 +168,25 @@ class Category(Base):
 
 
 class Order(Base):
+    # В PostgreSQL таблица секционирована по месяцам start_date, и первичный ключ
+    # в БД - (id, start_date). Пересечения броней проверяет Reservation.
+    # См. миграцию c6e8a0b2d4f7 и app/maintenance.py.
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_customer_id_id", "customer_id", "id"),
+        Index("ix_orders_start_date_id", "start_date", "id"),
+        # Заказы оборудования по периоду: /orders/incoming и пересчет доступности
+        Index(
+            "ix_orders_equipment_id_start_date_end_date",
+            "equipment_id",
+            "start_date",
+            "end_date",
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     customer_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("users.id", ondelete="RESTRICT"), nullable=False, index=True
+        Integer, ForeignKey("users.id", ondelete="RESTRICT"), nullable=False
     )
     equipment_id: Mapped[int] = mapped_column(
         Integer, ForeignKey("equipment.id", ondelete="RESTRICT"), nullable=False
@@ -119,17 +202,78 @@ class Order(Base):
         Numeric(10, 2), nullable=False, default=0, server_default=text("0")
     )
 
-    equipment: Mapped[Equipment] = relationship("Equipment", back_populates="order")
+    equipment: Mapped[Equipment] = relationship("Equipment", back_populates="orders")
     customer: Mapped[User] = relationship("User", back_populates="orders")
 
 
+class Reservation(Base):
+    """Период брони заказа, пишется в одной транзакции с заказом.
+
+    Таблица не секционирована, поэтому исключающее ограничение действует на все
+    заказы оборудования, в том числе пересекающие границу месяца. По ней же
+    ищутся пересечения и строится календарь: запрос не обходит секции orders.
+    """
+
+    __tablename__ = "reservations"
+    __table_args__ = (
+        # Пересекающиеся брони одного оборудования отклоняются самой БД.
+        # Только PostgreSQL (нужен btree_gist).
+        ExcludeConstraint(
+            ("equipment_id", "="),
+            (func.tstzrange(column("start_date"), column("end_date")), "&&"),
+            name="ex_reservations_equipment_id_period",
+            using="gist",
+        ).ddl_if(dialect="postgresql"),
+    )
+
+    order_id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, autoincrement=False
+    )
+    equipment_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("equipment.id", ondelete="RESTRICT"), nullable=False
+    )
+    start_date: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+    end_date: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
 class Session(Base):
     __tablename__ = "sessions"
 
     id: Mapped[str] = mapped_column(String(64), primary_key=True)
     user_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
     )
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), nullable=False, default=lambda: datetime.now(UTC)
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(UTC),
+        index=True,
+    )
+
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    jti: Mapped[str] = mapped_column(String(32), primary_key=True)
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
+
+
+class IdempotencyKey(Base):
+    """Первый успешный ответ на запрос с заголовком Idempotency-Key"""
+
+    __tablename__ = "idempotency_keys"
+
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    request_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    status_code: Mapped[int] = mapped_column(Integer, nullable=False)
+    body: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
     )
@@ -0,0 +1,115 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any
+
+from fastapi import HTTPException, Request, Response, status
+from sqlalchemy import Select, func, literal, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+
+
+def encode_cursor(sort_key: str, ascending: bool, value: Any, last_id: int) -> str:
+    if isinstance(value, Decimal | datetime):
+        value = str(value) if isinstance(value, Decimal) else value.isoformat()
+    raw = json.dumps(
+        {"k": sort_key, "a": ascending, "v": value, "id": last_id},
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(
+    cursor: str, sort_key: str, ascending: bool, column: InstrumentedAttribute
+) -> tuple[Any, int]:
+    """Разбирает курсор и проверяет, что он выдан для той же сортировки"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if data["k"] != sort_key or data["a"] != ascending:
+            raise ValueError
+        value = data["v"]
+        python_type = column.type.python_type
+        if python_type is Decimal:
+            value = Decimal(value)
+        elif python_type is datetime:
+            value = datetime.fromisoformat(value)
+        return value, int(data["id"])
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор или курсор выдан для другой сортировки",
+        ) from None
+
+
+async def paginate(
+    session: AsyncSession,
+    stmt: Select,
+    request: Request,
+    response: Response,
+    *,
+    sort_key: str,
+    column: InstrumentedAttribute,
+    id_column: InstrumentedAttribute,
+    ascending: bool,
+    cursor: str | None,
+    limit: int,
+) -> list:
+    """Keyset-пагинация по (column, id).
+
+    Следующая страница начинается строго после последней строки текущей, поэтому
+    стоимость запроса не зависит от номера страницы. Если есть еще строки,
+    курсор следующей страницы отдается в X-Next-Cursor и в Link (rel="next").
+    """
+    if column is id_column:
+        keys, position = (column,), column
+    else:
+        keys, position = (column, id_column), tuple_(column, id_column)
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_key, ascending, column)
+        last = value if column is id_column else tuple_(value, last_id)
+        stmt = stmt.where(position > last if ascending else position < last)
+    rows = (
+        await session.scalars(
+            stmt.order_by(
+                *(key.asc() if ascending else key.desc() for key in keys)
+            ).limit(limit + 1)
+        )
+    ).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_row = rows[-1]
+        next_cursor = encode_cursor(
+            sort_key, ascending, getattr(last_row, column.key), last_row.id
+        )
+        next_url = request.url.remove_query_params("offset").include_query_params(
+            cursor=next_cursor
+        )
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return rows
+
+
+async def exact_count(session: AsyncSession, stmt: Select) -> int:
+    # Колонки сущности подзапросу не нужны, считаются только строки
+    rows = stmt.with_only_columns(literal(1), maintain_column_froms=True)
+    return await session.scalar(
+        select(func.count()).select_from(rows.order_by(None).subquery())
+    )
+
+
+async def estimated_count(session: AsyncSession, table_name: str) -> int | None:
+    """Оценка числа строк таблицы из статистики планировщика (только PostgreSQL).
+
+    None, если оценки нет: другая СУБД или таблица еще не анализировалась.
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        return None
+    reltuples = await session.scalar(
+        text(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:name AS regclass)"
+        ),
+        {"name": table_name},
+    )
+    return reltuples if reltuples is not None and reltuples >= 0 else None
@@ -0,0 +1,43 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+
+load_dotenv()
+
+# bcrypt отпускает GIL, поэтому пула потоков достаточно.
+password_workers = int(os.getenv("PASSWORD_WORKERS", 4))
+# Сколько операций может ждать свободного потока сверх работающих
+password_queue_size = int(os.getenv("PASSWORD_QUEUE_SIZE", 64))
+
+executor = ThreadPoolExecutor(
+    max_workers=password_workers, thread_name_prefix="password"
+)
+slots = asyncio.Semaphore(password_workers + password_queue_size)
+
+
+async def run_in_password_pool(func, *args):
+    """Выполняет функцию в пуле паролей. При переполнении очереди сразу отдает 503"""
+    if slots.locked():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервер перегружен, повторите попытку позже",
+            headers={"Retry-After": "1"},
+        )
+    async with slots:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+async def hash_password(password: str) -> bytes:
+    return await run_in_password_pool(
+        bcrypt.hashpw, password.encode(), bcrypt.gensalt()
+    )
+
+
+async def check_password(password: str, hashed_password: bytes) -> bool:
+    return await run_in_password_pool(
+        bcrypt.checkpw, password.encode(), hashed_password
+    )
@@ -0,0 +1,34 @@
+import os
+from datetime import datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Literal
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PartialDayRule = Literal["floor", "ceil", "prorate"]
+
+# Как считать неполные сутки аренды: floor - не считать, ceil - как целые
+# сутки, prorate - пропорционально времени
+partial_day_rule: PartialDayRule = os.getenv("PARTIAL_DAY_RULE", "floor")
+if partial_day_rule not in ("floor", "ceil", "prorate"):
+    raise ValueError("PARTIAL_DAY_RULE must be one of: floor, ceil, prorate")
+
+day = timedelta(days=1)
+cent = Decimal("0.01")
+
+
+def rental_price(start: datetime, end: datetime, price_per_day: Decimal) -> Decimal:
+    """Стоимость аренды на [start, end) по правилу partial_day_rule"""
+    days, remainder = divmod(end - start, day)
+    if partial_day_rule == "prorate":
+        # Точная арифметика Decimal по микросекундам, без float
+        units = Decimal(days) + Decimal(remainder // timedelta(microseconds=1)) / (
+            Decimal(day // timedelta(microseconds=1))
+        )
+    elif partial_day_rule == "ceil" and remainder:
+        units = Decimal(days + 1)
+    else:
+        units = Decimal(days)
+    return (price_per_day * units).quantize(cent, rounding=ROUND_HALF_UP)
@@ -6,9 +6,12 @@ from fastapi import APIRouter, Body, Depends, HTTPException, Path, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_session
+from app.cache import calendar_cache, session_cache
+from app.database import engine, get_session, pool_checkout
 from app.models import User
+from app.passwords import check_password
 from app.schemas import PromoteRequest, UserOut
+from app.supfunctions import get_current_admin
 
 router = APIRouter()
 
@@ -31,6 +34,7 @@ hashed_root_password = bcrypt.hashpw(root_password.encode(), bcrypt.gensalt())
         409: {"description": "Пользователь уже в роли администратора"},
         422: {"description": "Ошибка валидации данных"},
         500: {"description": "Ошибка со стороны сервера"},
+        503: {"description": "Сервер перегружен, повторите попытку позже"},
     },
 )
 async def promote_to_admin(
@@ -39,7 +43,7 @@ async def promote_to_admin(
     session: AsyncSession = Depends(get_session),
 ) -> UserOut:
     user = await session.scalar(select(User).where(User.id == user_id))
-    if not user or not bcrypt.checkpw(rootpass.password.encode(), hashed_root_password):
+    if not user or not await check_password(rootpass.password, hashed_root_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный запрос"
         )
@@ -55,4 +59,24 @@ async def promote_to_admin(
     except:
         await session.rollback()
         raise
+    session_cache.pop_where(lambda cached: cached.id == user.id)
     return UserOut.model_validate(user)
+
+
+@router.get(
+    "/metrics",
+    status_code=status.HTTP_200_OK,
+    summary="Служебные метрики",
+    description="Возвращает счетчики внутренних кэшей и пулов. Доступно только администраторам",
+    responses={
+        200: {"description": "OK"},
+        401: {"description": "Вы не авторизованы"},
+        403: {"description": "У вас нет прав администратора"},
+    },
+)
+async def get_metrics(_current_admin: User = Depends(get_current_admin)) -> dict:
+    return {
+        "session_cache": session_cache.stats(),
+        "calendar_cache": calendar_cache.stats(),
+        "db_pool": {"status": engine.pool.status(), "checkout": pool_checkout.stats()},
+    }
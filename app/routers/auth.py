@@ -1,12 +1,15 @@
 import secrets
+from datetime import UTC, datetime, timedelta
 
-import bcrypt
 from fastapi import APIRouter, Body, Cookie, Depends, HTTPException, Response, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app import tokens
+from app.cache import session_cache
 from app.database import get_session
 from app.models import Session, User
+from app.passwords import check_password, hash_password
 from app.schemas import UserCreate, UserOut
 from app.supfunctions import get_current_user
 
@@ -24,6 +27,7 @@ router = APIRouter()
         409: {"description": "Имя пользователя занято"},
         422: {"description": "Ошибка валидации данных"},
         500: {"description": "Ошибка со стороны сервера"},
+        503: {"description": "Сервер перегружен, повторите попытку позже"},
     },
 )
 async def register_user(
@@ -31,7 +35,7 @@ async def register_user(
     session: AsyncSession = Depends(get_session),
 ) -> UserOut:
     username = user_in.username
-    hashed_password = bcrypt.hashpw(user_in.password.encode(), bcrypt.gensalt())
+    hashed_password = await hash_password(user_in.password)
     user = User(username=username, hashed_password=hashed_password)
     session.add(user)
     try:
@@ -53,6 +57,7 @@ async def register_user(
         401: {"description": "Неверно введены имя пользователя или пароль"},
         422: {"description": "Ошибка валидации данных"},
         500: {"description": "Ошибка со стороны сервера"},
+        503: {"description": "Сервер перегружен, повторите попытку позже"},
     },
 )
 async def login(
@@ -61,28 +66,42 @@ async def login(
     session_id: str = Cookie(None),
     session: AsyncSession = Depends(get_session),
 ):
-    if session_id:
-        db_session = await session.scalar(
-            select(Session).where(Session.id == session_id)
-        )
-        if db_session:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail="Вы уже авторизованы"
+    if tokens.auth_mode == "signed":
+        authorized = tokens.read_token(session_id) is not None
+    elif session_id:
+        authorized = (
+            await session.scalar(
+                select(Session).where(
+                    Session.id == session_id,
+                    Session.created_at
+                    > datetime.now(UTC) - timedelta(seconds=tokens.session_ttl),
+                )
             )
+            is not None
+        )
+    else:
+        authorized = False
+    if authorized:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Вы уже авторизованы"
+        )
     user = await session.scalar(select(User).where(User.username == user_in.username))
-    if not user or not bcrypt.checkpw(user_in.password.encode(), user.hashed_password):
+    if not user or not await check_password(user_in.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверно введены имя пользователя или пароль",
         )
-    session_id = secrets.token_hex(32)
-    db_session = Session(id=session_id, user_id=user.id)
-    session.add(db_session)
-    try:
-        await session.commit()
-    except Exception:
-        await session.rollback()
-        raise
+    if tokens.auth_mode == "signed":
+        session_id = tokens.issue_token(user)
+    else:
+        session_id = secrets.token_hex(32)
+        db_session = Session(id=session_id, user_id=user.id)
+        session.add(db_session)
+        try:
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
     response.set_cookie(key="session_id", value=session_id, httponly=True)
     return {"message": "Успешно авторизовано"}
 
@@ -123,12 +142,18 @@ async def logout(
     session_id: str = Cookie(...),
     session: AsyncSession = Depends(get_session),
 ):
-    db_session = await session.scalar(select(Session).where(Session.id == session_id))
-    await session.delete(db_session)
+    if tokens.auth_mode == "signed":
+        tokens.revoke(session, tokens.read_token(session_id))
+    else:
+        db_session = await session.scalar(
+            select(Session).where(Session.id == session_id)
+        )
+        await session.delete(db_session)
     response.delete_cookie("session_id")
     try:
         await session.commit()
     except:
         await session.rollback()
         raise
+    session_cache.pop(session_id)
     return {"message": "Вы вышли из аккаунта"}
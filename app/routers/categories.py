@@ -1,14 +1,25 @@
-from fastapi import APIRouter, Body, Depends, HTTPException, Path, Query, status
-from sqlalchemy import asc, desc, select
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from sqlalchemy import func, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
-from app.database import get_session
+from app.database import get_read_session, get_session
 from app.models import Category, Equipment, User
+from app.pagination import exact_count, paginate
 from app.schemas import (
     CategoryCreate,
     CategoryOutFull,
     CategoryOutSimple,
+    CategorySummary,
     EquipmentOutbyCategory,
 )
 from app.supfunctions import get_current_admin, get_current_user, sortdict
@@ -28,6 +39,13 @@ async def get_category(
     return category
 
 
+async def get_read_category(
+    category_id: int = Path(..., description="ID категории"),
+    session: AsyncSession = Depends(get_read_session),
+) -> Category:
+    return await get_category(category_id, session)
+
+
 @router.post(
     "",
     status_code=status.HTTP_201_CREATED,
@@ -48,14 +66,16 @@ async def add_category(
     _current_admin: User = Depends(get_current_admin),
     session: AsyncSession = Depends(get_session),
 ) -> CategoryOutSimple:
-    category = Category(**category_in.model_dump(exclude_unset=True))
-    session.add(category)
     try:
+        category = await session.scalar(
+            insert(Category)
+            .values(**category_in.model_dump(exclude_unset=True))
+            .returning(Category)
+        )
         await session.commit()
     except:
         await session.rollback()
         raise
-    await session.refresh(category)
     return CategoryOutSimple.model_validate(category)
 
 
@@ -68,7 +88,7 @@ async def add_category(
     responses={
         200: {"description": "OK"},
         400: {
-            "description": "Категории могут быть отсортированы только по ID или названию"
+            "description": "Некорректный курсор. Категории могут быть отсортированы только по ID или названию"
         },
         401: {"description": "Вы не авторизованы"},
         422: {"description": "Ошибка валидации данных"},
@@ -76,30 +96,43 @@ async def add_category(
     },
 )
 async def get_categories(
+    request: Request,
+    response: Response,
     sorted_by: str = Query("title", description="Сортировка по id/title"),
     order: bool = Query(
         False,
         description="Сортировка по алфавиту, если title, и по возрастанию, если id - True, обратное - False",
     ),
-    limit: int = Query(10, description="Количество выводимых категорий"),
-    offset: int = Query(0, description="Пропуск n категорий перед выводом"),
+    limit: int = Query(10, ge=1, le=100, description="Количество выводимых категорий"),
+    offset: int = Query(
+        0,
+        description="Пропуск n категорий перед выводом. Не используется вместе с cursor",
+    ),
+    cursor: str | None = Query(
+        None,
+        description="Курсор следующей страницы из заголовка X-Next-Cursor предыдущего ответа",
+    ),
     _current_user: User = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
 ) -> list[CategoryOutSimple]:
     if sorted_by not in ("id", "title"):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Категории могут быть отсортированы только по ID или названию",
         )
-    srt = Category.id if sorted_by == "id" else Category.title
-    categories = (
-        await session.scalars(
-            select(Category)
-            .order_by(asc(srt) if order else desc(srt))
-            .limit(limit)
-            .offset(offset)
-        )
-    ).all()
+    stmt = select(Category)
+    categories = await paginate(
+        session,
+        stmt if cursor else stmt.offset(offset),
+        request,
+        response,
+        sort_key=sorted_by,
+        column=Category.id if sorted_by == "id" else Category.title,
+        id_column=Category.id,
+        ascending=order,
+        cursor=cursor,
+        limit=limit,
+    )
     return [CategoryOutSimple.model_validate(category) for category in categories]
 
 
@@ -108,25 +141,62 @@ async def get_categories(
     status_code=status.HTTP_200_OK,
     response_model=CategoryOutFull,
     summary="Поиск категории по ID",
-    description="Возвращает категорию с оборудованием по введеному ID категории",
+    description="Возвращает категорию со сводкой и первой страницей оборудования по введеному ID категории. Следующая страница запрашивается по курсору из next_cursor (или заголовка X-Next-Cursor)",
     responses={
         200: {"description": "OK"},
+        400: {"description": "Некорректный курсор"},
         401: {"description": "Вы не авторизованы"},
         404: {"description": "Категория не найдена"},
         422: {"description": "Ошибка валидации данных"},
     },
 )
 async def get_category_with_equipment(
+    request: Request,
+    response: Response,
+    limit: int = Query(
+        20, ge=1, le=100, description="Количество выводимых строк оборудования"
+    ),
+    cursor: str | None = Query(
+        None,
+        description="Курсор следующей страницы оборудования из next_cursor предыдущего ответа",
+    ),
     _current_user: User = Depends(get_current_user),
-    category: Category = Depends(get_category),
-    session: AsyncSession = Depends(get_session),
+    category: Category = Depends(get_read_category),
+    session: AsyncSession = Depends(get_read_session),
 ) -> CategoryOutFull:
-    category_full = await session.scalar(
-        select(Category)
-        .where(Category.id == category.id)
-        .options(selectinload(Category.equipment))
+    in_category = Equipment.category_id == category.id
+    summary = (
+        await session.execute(
+            select(
+                func.count().label("equipment_count"),
+                func.count().filter(Equipment.is_available).label("available_count"),
+                func.min(Equipment.price_per_day).label("min_price"),
+                func.max(Equipment.price_per_day).label("max_price"),
+            ).where(in_category)
+        )
+    ).one()
+    equipment_list = await paginate(
+        session,
+        select(Equipment).where(in_category),
+        request,
+        response,
+        sort_key="id",
+        column=Equipment.id,
+        id_column=Equipment.id,
+        ascending=True,
+        cursor=cursor,
+        limit=limit,
+    )
+    return CategoryOutFull(
+        id=category.id,
+        title=category.title,
+        summary=CategorySummary.model_validate(summary._mapping),
+        equipment=[
+            EquipmentOutbyCategory.model_validate(equipment)
+            for equipment in equipment_list
+        ],
+        next_cursor=response.headers.get("X-Next-Cursor"),
     )
-    return CategoryOutFull.model_validate(category_full)
 
 
 @router.get(
@@ -137,41 +207,66 @@ async def get_category_with_equipment(
     description="Выводит список оборудования, относящийся к категории с введенным ID. Возвращаются объекты оборудования, а не категория",
     responses={
         200: {"description": "OK"},
-        400: {"description": "Некорректный параметр сортировки"},
+        400: {"description": "Некорректный параметр сортировки или курсор"},
         401: {"description": "Вы не авторизованы"},
         404: {"description": "Категория не найдена"},
         422: {"description": "Ошибка валидации данных"},
     },
 )
 async def get_equipment_by_category(
+    request: Request,
+    response: Response,
     sorted_by: str = Query(
-        "id", description="Параметр сортировки. id | title | available | owner"
+        "id", description="Параметр сортировки. id | title | available | owner | price"
     ),
     order: bool = Query(
         False,
         description="Сортировка по алфавиту/по возрастанию - True, обратное - False",
     ),
-    limit: int = Query(10, description="Количество выводимых строк оборудования"),
-    offset: int = Query(0, description="Пропуск n строк оборудования перед выводом"),
+    limit: int = Query(
+        10, ge=1, le=100, description="Количество выводимых строк оборудования"
+    ),
+    offset: int = Query(
+        0,
+        description="Пропуск n строк оборудования перед выводом. Не используется вместе с cursor",
+    ),
+    cursor: str | None = Query(
+        None,
+        description="Курсор следующей страницы из заголовка X-Next-Cursor предыдущего ответа",
+    ),
+    count: bool = Query(
+        False,
+        description="Вернуть общее количество оборудования категории в заголовке X-Total-Count",
+    ),
+    exact: bool = Query(
+        False,
+        description="Точный подсчет вместо счетчика категории для X-Total-Count",
+    ),
     _current_user: User = Depends(get_current_user),
-    category: Category = Depends(get_category),
-    session: AsyncSession = Depends(get_session),
+    category: Category = Depends(get_read_category),
+    session: AsyncSession = Depends(get_read_session),
 ) -> list[EquipmentOutbyCategory]:
     if sorted_by not in sortdict.keys() or sorted_by == "category":
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Оборудование может быть отсортировано только по следующим параметрам: id, title, available, owner",
+            detail="Оборудование может быть отсортировано только по следующим параметрам: id, title, available, owner, price",
         )
-    equipment_list = (
-        await session.scalars(
-            select(Equipment)
-            .options(selectinload(Equipment.owner))
-            .where(Equipment.category_id == category.id)
-            .order_by(asc(sortdict[sorted_by]) if order else desc(sortdict[sorted_by]))
-            .limit(limit)
-            .offset(offset)
-        )
-    ).all()
+    stmt = select(Equipment).where(Equipment.category_id == category.id)
+    equipment_list = await paginate(
+        session,
+        stmt if cursor else stmt.offset(offset),
+        request,
+        response,
+        sort_key=sorted_by,
+        column=sortdict[sorted_by],
+        id_column=Equipment.id,
+        ascending=order,
+        cursor=cursor,
+        limit=limit,
+    )
+    if count:
+        total = await exact_count(session, stmt) if exact else category.equipment_count
+        response.headers["X-Total-Count"] = str(total)
     return [
         EquipmentOutbyCategory.model_validate(equipment) for equipment in equipment_list
     ]
@@ -199,14 +294,18 @@ async def update_category(
     category: Category = Depends(get_category),
     session: AsyncSession = Depends(get_session),
 ) -> CategoryOutSimple:
-    for key, value in category_in.model_dump().items():
-        setattr(category, key, value)
     try:
+        category = await session.scalar(
+            update(Category)
+            .where(Category.id == category.id)
+            .values(**category_in.model_dump())
+            .returning(Category)
+            .execution_options(populate_existing=True)
+        )
         await session.commit()
     except:
         await session.rollback()
         raise
-    await session.refresh(category)
     return CategoryOutSimple.model_validate(category)
 
 
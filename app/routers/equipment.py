@@ -1,11 +1,47 @@
-from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
-from sqlalchemy import asc, desc, select
+from datetime import UTC, datetime
+
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from sqlalchemy import exists, func, insert, literal_column, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_session
-from app.models import Equipment, User
-from app.schemas import EquipmentCreate, EquipmentOut, EquipmentUpdate
-from app.supfunctions import get_current_user, get_equipment, get_owner, sortdict
+from app.availability import as_utc, build_calendar
+from app.cache import calendar_cache
+from app.database import get_read_session, get_session
+from app.idempotency import Idempotency, get_idempotency
+from app.imports import EquipmentImport, ImportFormat, read_lines, read_records
+from app.models import Equipment, Reservation, User
+from app.pagination import estimated_count, exact_count, paginate
+from app.schemas import (
+    Availability,
+    AvailabilityInterval,
+    EquipmentCreate,
+    EquipmentIds,
+    EquipmentOut,
+    EquipmentUpdate,
+    ImportResult,
+)
+from app.supfunctions import (
+    change_equipment_count,
+    equipment_filters,
+    get_current_user,
+    get_equipment,
+    get_equipment_by_ids,
+    get_owned_equipment,
+    get_read_equipment,
+    max_batch_ids,
+    overlaps,
+    sortdict,
+)
 
 router = APIRouter()
 
@@ -15,12 +51,16 @@ router = APIRouter()
     status_code=status.HTTP_201_CREATED,
     response_model=EquipmentOut,
     summary="Добавить оборудование",
-    description="Добавляет оборудование. Оборудование привязывается к авторизованному пользователю",
+    description="Добавляет оборудование. Оборудование привязывается к авторизованному пользователю. Повтор запроса с тем же заголовком Idempotency-Key возвращает первый ответ",
     responses={
         201: {"description": "Оборудование успешно добавлено"},
         401: {"description": "Вы не авторизованы"},
-        409: {"description": "Некорректная вставка данных в БД"},
-        422: {"description": "Ошибка валидации данных"},
+        409: {
+            "description": "Некорректная вставка данных в БД или запрос с этим ключом идемпотентности еще выполняется"
+        },
+        422: {
+            "description": "Ошибка валидации данных или ключ идемпотентности использован с другим запросом"
+        },
         500: {"description": "Ошибка со стороны сервера"},
     },
 )
@@ -28,18 +68,58 @@ async def create_equipment(
     equipment_in: EquipmentCreate = Body(..., description="Объект нового оборудования"),
     current_user: User = Depends(get_current_user),
     session: AsyncSession = Depends(get_session),
+    idempotency: Idempotency = Depends(get_idempotency),
 ) -> EquipmentOut:
-    equipment = Equipment(
-        **equipment_in.model_dump(exclude_unset=True), owner_id=current_user.id
-    )
-    session.add(equipment)
     try:
+        equipment = await session.scalar(
+            insert(Equipment)
+            .values(
+                **equipment_in.model_dump(exclude_unset=True), owner_id=current_user.id
+            )
+            .returning(Equipment)
+        )
+        await session.execute(change_equipment_count(equipment.category_id, 1))
+        result = EquipmentOut.model_validate(equipment)
+        await idempotency.save(result, status.HTTP_201_CREATED)
         await session.commit()
     except:
         await session.rollback()
         raise
-    await session.refresh(equipment)
-    return EquipmentOut.model_validate(equipment)
+    return result
+
+
+@router.post(
+    "/import",
+    status_code=status.HTTP_200_OK,
+    response_model=ImportResult,
+    summary="Массово добавить оборудование",
+    description="Принимает тело запроса в NDJSON (объект EquipmentCreate в каждой строке) или CSV (заголовок с полями EquipmentCreate). Строки проверяются и добавляются пачками, ошибочные строки не мешают остальным и возвращаются в отчете",
+    responses={
+        200: {"description": "Импорт завершен, ошибки по строкам в отчете"},
+        401: {"description": "Вы не авторизованы"},
+        422: {"description": "Ошибка валидации данных"},
+        500: {"description": "Ошибка со стороны сервера"},
+    },
+)
+async def import_equipment(
+    request: Request,
+    import_format: ImportFormat = Query(
+        "ndjson", alias="format", description="Формат тела запроса. ndjson | csv"
+    ),
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+) -> ImportResult:
+    records = read_records(read_lines(request.stream()), import_format)
+    return await EquipmentImport(session, current_user.id).run(records)
+
+
+async def equipment_by_ids(
+    session: AsyncSession, response: Response, ids: list[int]
+) -> list[EquipmentOut]:
+    equipment_list, missing = await get_equipment_by_ids(session, ids)
+    if missing:
+        response.headers["X-Missing-Ids"] = ",".join(map(str, missing))
+    return [EquipmentOut.model_validate(equipment) for equipment in equipment_list]
 
 
 @router.get(
@@ -47,43 +127,227 @@ async def create_equipment(
     status_code=status.HTTP_200_OK,
     response_model=list[EquipmentOut],
     summary="Вывести список оборудования",
-    description="Возвращает список оборудования",
+    description="Возвращает список оборудования с фильтрами по цене, доступности, владельцу и категории. Следующая страница запрашивается по курсору из заголовка X-Next-Cursor (или Link). С параметром ids возвращает оборудование с перечисленными ID в том же порядке, ненайденные ID - в заголовке X-Missing-Ids",
     responses={
         200: {"description": "OK"},
         400: {
-            "description": "Оборудование может быть отсортировано только по следующим параметрам: id, title, available, owner, category"
+            "description": "Некорректный параметр сортировки, курсор или список ID. Оборудование может быть отсортировано только по следующим параметрам: id, title, available, owner, category, price"
         },
         401: {"description": "Вы не авторизованы"},
         422: {"description": "Ошибка валидации данных"},
     },
 )
 async def get_list_of_equipment(
+    request: Request,
+    response: Response,
     sorted_by: str = Query(
         "id",
-        description="Параметр сортировки. id | title | available | owner | category",
+        description="Параметр сортировки. id | title | available | owner | category | price",
     ),
     order: bool = Query(
         False,
         description="Сортировка по алфавиту/по возрастанию - True, обратное - False",
     ),
-    limit: int = Query(10, description="Количество выводимых строк оборудования"),
-    offset: int = Query(0, description="Пропуск n строк оборудования перед выводом"),
+    limit: int = Query(
+        10, ge=1, le=100, description="Количество выводимых строк оборудования"
+    ),
+    offset: int = Query(
+        0,
+        description="Пропуск n строк оборудования перед выводом. Не используется вместе с cursor",
+    ),
+    cursor: str | None = Query(
+        None,
+        description="Курсор следующей страницы из заголовка X-Next-Cursor предыдущего ответа",
+    ),
+    count: bool = Query(
+        False,
+        description="Вернуть общее количество строк в заголовке X-Total-Count. Без фильтров и exact - оценка по статистике БД",
+    ),
+    exact: bool = Query(False, description="Точный подсчет для X-Total-Count"),
+    ids: str | None = Query(
+        None,
+        description="ID оборудования через запятую. Если задан, сортировка, фильтры и пагинация не применяются",
+        examples=["3,1,2"],
+    ),
+    filters: list = Depends(equipment_filters),
     _current_user: User = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
 ) -> list[EquipmentOut]:
+    if ids is not None:
+        try:
+            id_list = [int(id_) for id_ in ids.split(",") if id_.strip()]
+        except ValueError:
+            id_list = []
+        if not id_list or len(id_list) > max_batch_ids:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"ids должен содержать от 1 до {max_batch_ids} целых чисел через запятую",
+            )
+        return await equipment_by_ids(session, response, id_list)
     if sorted_by not in sortdict.keys():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Оборудование может быть отсортировано только по следующим параметрам: id, title, available, owner, category",
+            detail="Оборудование может быть отсортировано только по следующим параметрам: id, title, available, owner, category, price",
         )
-    equipment_list = (
-        await session.scalars(
+    stmt = select(Equipment).where(*filters)
+    equipment_list = await paginate(
+        session,
+        stmt if cursor else stmt.offset(offset),
+        request,
+        response,
+        sort_key=sorted_by,
+        column=sortdict[sorted_by],
+        id_column=Equipment.id,
+        ascending=order,
+        cursor=cursor,
+        limit=limit,
+    )
+    if count:
+        total = None
+        if not exact and not filters:
+            total = await estimated_count(session, Equipment.__tablename__)
+        if total is None:
+            total = await exact_count(session, stmt)
+        response.headers["X-Total-Count"] = str(total)
+    return [EquipmentOut.model_validate(equipment) for equipment in equipment_list]
+
+
+@router.post(
+    "/batch",
+    status_code=status.HTTP_200_OK,
+    response_model=list[EquipmentOut],
+    summary="Найти оборудование по списку ID",
+    description="Возвращает оборудование с перечисленными ID в том же порядке. Ненайденные ID перечисляются в заголовке X-Missing-Ids. Для длинных списков, не помещающихся в GET /equipment?ids=",
+    responses={
+        200: {"description": "OK"},
+        401: {"description": "Вы не авторизованы"},
+        422: {"description": "Ошибка валидации данных"},
+    },
+)
+async def get_equipment_batch(
+    response: Response,
+    equipment_ids: EquipmentIds = Body(..., description="Список ID оборудования"),
+    _current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session),
+) -> list[EquipmentOut]:
+    return await equipment_by_ids(session, response, equipment_ids.ids)
+
+
+@router.get(
+    "/available",
+    status_code=status.HTTP_200_OK,
+    response_model=list[EquipmentOut],
+    summary="Найти оборудование, свободное на период",
+    description="Возвращает оборудование без заказов, пересекающихся с [from, to), с фильтрами как у списка оборудования. Следующая страница запрашивается по курсору из заголовка X-Next-Cursor (или Link)",
+    responses={
+        200: {"description": "OK"},
+        400: {
+            "description": "Некорректный период, параметр сортировки или курсор. Оборудование может быть отсортировано только по следующим параметрам: id, title, available, owner, category, price"
+        },
+        401: {"description": "Вы не авторизованы"},
+        422: {"description": "Ошибка валидации данных"},
+    },
+)
+async def get_available_equipment(
+    request: Request,
+    response: Response,
+    start: datetime = Query(..., alias="from", description="Начало периода аренды"),
+    end: datetime = Query(..., alias="to", description="Конец периода аренды"),
+    sorted_by: str = Query(
+        "id",
+        description="Параметр сортировки. id | title | available | owner | category | price",
+    ),
+    order: bool = Query(
+        False,
+        description="Сортировка по алфавиту/по возрастанию - True, обратное - False",
+    ),
+    limit: int = Query(
+        10, ge=1, le=100, description="Количество выводимых строк оборудования"
+    ),
+    cursor: str | None = Query(
+        None,
+        description="Курсор следующей страницы из заголовка X-Next-Cursor предыдущего ответа",
+    ),
+    filters: list = Depends(equipment_filters),
+    _current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session),
+) -> list[EquipmentOut]:
+    start, end = as_utc(start), as_utc(end)
+    if end <= start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Конец периода должен быть позже начала",
+        )
+    if sorted_by not in sortdict.keys():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Оборудование может быть отсортировано только по следующим параметрам: id, title, available, owner, category, price",
+        )
+    # NOT EXISTS по GiST-индексу ограничения ex_reservations_equipment_id_period
+    booked = exists().where(
+        Reservation.equipment_id == Equipment.id, overlaps(start, end)
+    )
+    equipment_list = await paginate(
+        session,
+        select(Equipment).where(*filters, ~booked),
+        request,
+        response,
+        sort_key=sorted_by,
+        column=sortdict[sorted_by],
+        id_column=Equipment.id,
+        ascending=order,
+        cursor=cursor,
+        limit=limit,
+    )
+    return [EquipmentOut.model_validate(equipment) for equipment in equipment_list]
+
+
+@router.get(
+    "/search",
+    status_code=status.HTTP_200_OK,
+    response_model=list[EquipmentOut],
+    summary="Поиск оборудования",
+    description="Полнотекстовый поиск по наименованию и описанию с учетом опечаток в наименовании. Результаты отсортированы по релевантности",
+    responses={
+        200: {"description": "OK"},
+        401: {"description": "Вы не авторизованы"},
+        422: {"description": "Ошибка валидации данных"},
+    },
+)
+async def search_equipment(
+    q: str = Query(..., min_length=1, description="Поисковый запрос"),
+    limit: int = Query(
+        10, ge=1, le=100, description="Количество выводимых строк оборудования"
+    ),
+    offset: int = Query(
+        0, ge=0, description="Пропуск n строк оборудования перед выводом"
+    ),
+    _current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session),
+) -> list[EquipmentOut]:
+    if session.get_bind().dialect.name == "postgresql":
+        # search_vector - генерируемая колонка с GIN-индексом (см. миграцию
+        # c4e8a1f7d392), оператор %> по заголовку использует триграммный индекс
+        vector = Equipment.search_vector
+        query = func.websearch_to_tsquery(literal_column("'russian'::regconfig"), q)
+        rank = func.ts_rank(vector, query) + func.word_similarity(q, Equipment.title)
+        stmt = (
             select(Equipment)
-            .order_by(asc(sortdict[sorted_by]) if order else desc(sortdict[sorted_by]))
-            .limit(limit)
-            .offset(offset)
+            .where(or_(vector.bool_op("@@")(query), Equipment.title.bool_op("%>")(q)))
+            .order_by(rank.desc(), Equipment.id)
         )
-    ).all()
+    else:
+        stmt = (
+            select(Equipment)
+            .where(
+                or_(
+                    Equipment.title.icontains(q, autoescape=True),
+                    Equipment.description.icontains(q, autoescape=True),
+                )
+            )
+            .order_by(Equipment.id)
+        )
+    equipment_list = await session.scalars(stmt.limit(limit).offset(offset))
     return [EquipmentOut.model_validate(equipment) for equipment in equipment_list]
 
 
@@ -102,11 +366,59 @@ async def get_list_of_equipment(
 )
 async def get_equipment_full(
     _current_user: User = Depends(get_current_user),
-    equipment: Equipment = Depends(get_equipment),
+    equipment: Equipment = Depends(get_read_equipment),
 ) -> EquipmentOut:
     return EquipmentOut.model_validate(equipment)
 
 
+@router.get(
+    "/{equipment_id}/availability",
+    status_code=status.HTTP_200_OK,
+    response_model=Availability,
+    summary="Календарь занятости оборудования",
+    description="Возвращает занятые и свободные периоды оборудования внутри [from, to). Даты без часового пояса считаются UTC",
+    responses={
+        200: {"description": "OK"},
+        400: {"description": "Конец периода должен быть позже начала"},
+        401: {"description": "Вы не авторизованы"},
+        404: {"description": "Оборудование не найдено"},
+        422: {"description": "Ошибка валидации данных"},
+    },
+)
+async def get_availability(
+    equipment_id: int = Path(..., description="ID оборудования"),
+    start: datetime = Query(..., alias="from", description="Начало периода"),
+    end: datetime = Query(..., alias="to", description="Конец периода"),
+    _current_user: User = Depends(get_current_user),
+    # Индекс кэшируется и обновляется только заказами этого процесса, поэтому
+    # строится с основной БД, а не с возможно отстающей реплики
+    session: AsyncSession = Depends(get_session),
+) -> Availability:
+    start, end = as_utc(start), as_utc(end)
+    if end <= start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Конец периода должен быть позже начала",
+        )
+    calendar = calendar_cache.get(equipment_id)
+    if calendar is None:
+        await get_equipment(equipment_id, session)
+        calendar = await build_calendar(session, equipment_id)
+    return Availability(
+        equipment_id=equipment_id,
+        start=start,
+        end=end,
+        busy=[
+            AvailabilityInterval(start=busy_start, end=busy_end)
+            for busy_start, busy_end in calendar.busy(start, end)
+        ],
+        free=[
+            AvailabilityInterval(start=free_start, end=free_end)
+            for free_start, free_end in calendar.free(start, end)
+        ],
+    )
+
+
 @router.put(
     "/{equipment_id}",
     status_code=status.HTTP_200_OK,
@@ -128,8 +440,7 @@ async def update_equipment(
     equipment_in: EquipmentUpdate = Body(
         ..., description="Схема обновления оборудования"
     ),
-    _current_owner: User = Depends(get_owner),
-    equipment: Equipment = Depends(get_equipment),
+    equipment: Equipment = Depends(get_owned_equipment),
     session: AsyncSession = Depends(get_session),
 ) -> EquipmentOut:
     updates = equipment_in.model_dump(exclude_unset=True, exclude_none=True).items()
@@ -138,14 +449,22 @@ async def update_equipment(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Для операции нужно изменить минимум 1 параметр",
         )
-    for key, value in updates:
-        setattr(equipment, key, value)
+    old_category_id = equipment.category_id
     try:
+        equipment = await session.scalar(
+            update(Equipment)
+            .where(Equipment.id == equipment.id)
+            .values(**dict(updates))
+            .returning(Equipment)
+            .execution_options(populate_existing=True)
+        )
+        if equipment.category_id != old_category_id:
+            await session.execute(change_equipment_count(old_category_id, -1))
+            await session.execute(change_equipment_count(equipment.category_id, 1))
         await session.commit()
     except:
         await session.rollback()
         raise
-    await session.refresh(equipment)
     return EquipmentOut.model_validate(equipment)
 
 
@@ -153,7 +472,7 @@ async def update_equipment(
     "/{equipment_id}",
     status_code=status.HTTP_204_NO_CONTENT,
     summary="Удалить оборудование",
-    description="Удаляет оборудование. Доступно владельцам. Оборудование нельзя удалить, если оно в действующем заказе",
+    description="Удаляет оборудование. Доступно владельцам. Оборудование нельзя удалить, если оно в действующем или будущем заказе",
     responses={
         204: {"description": "Оборудование успешно удалено"},
         401: {"description": "Вы не авторизованы"},
@@ -165,19 +484,28 @@ async def update_equipment(
     },
 )
 async def delete_equipment(
-    _current_owner: User = Depends(get_owner),
-    equipment: Equipment = Depends(get_equipment),
+    equipment: Equipment = Depends(get_owned_equipment),
     session: AsyncSession = Depends(get_session),
 ):
-    if not equipment.is_available:
+    active_order = await session.scalar(
+        select(Reservation.order_id)
+        .where(
+            Reservation.equipment_id == equipment.id,
+            Reservation.end_date > datetime.now(UTC),
+        )
+        .limit(1)
+    )
+    if active_order:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Вы не можете удалить арендованное оборудование",
         )
     try:
         await session.delete(equipment)
+        await session.execute(change_equipment_count(equipment.category_id, -1))
         await session.commit()
     except:
         await session.rollback()
         raise
+    calendar_cache.pop(equipment.id)
     return
@@ -0,0 +1,99 @@
+from fastapi import APIRouter, Depends, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import get_read_session_maker
+from app.exports import ExportFormat, export_response
+from app.models import Equipment, Order, User
+from app.schemas import EquipmentOut, OrderOut
+from app.supfunctions import get_current_admin, get_current_user
+
+router = APIRouter()
+
+
+@router.get(
+    "/equipment",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    summary="Выгрузить весь каталог оборудования",
+    description="Потоковая выгрузка всего оборудования в NDJSON или CSV. Доступна только администраторам",
+    responses={
+        200: {"description": "OK"},
+        401: {"description": "Вы не авторизованы"},
+        403: {"description": "У вас нет прав администратора"},
+        422: {"description": "Ошибка валидации данных"},
+    },
+)
+async def export_all_equipment(
+    export_format: ExportFormat = Query(
+        "ndjson", alias="format", description="Формат выгрузки. ndjson | csv"
+    ),
+    _current_admin: User = Depends(get_current_admin),
+    session_maker: async_sessionmaker[AsyncSession] = Depends(get_read_session_maker),
+) -> StreamingResponse:
+    return export_response(
+        session_maker,
+        select(Equipment).order_by(Equipment.id),
+        EquipmentOut,
+        export_format,
+        "equipment",
+    )
+
+
+@router.get(
+    "/me/equipment",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    summary="Выгрузить свое оборудование",
+    description="Потоковая выгрузка оборудования текущего пользователя в NDJSON или CSV",
+    responses={
+        200: {"description": "OK"},
+        401: {"description": "Вы не авторизованы"},
+        422: {"description": "Ошибка валидации данных"},
+    },
+)
+async def export_own_equipment(
+    export_format: ExportFormat = Query(
+        "ndjson", alias="format", description="Формат выгрузки. ndjson | csv"
+    ),
+    current_user: User = Depends(get_current_user),
+    session_maker: async_sessionmaker[AsyncSession] = Depends(get_read_session_maker),
+) -> StreamingResponse:
+    return export_response(
+        session_maker,
+        select(Equipment)
+        .where(Equipment.owner_id == current_user.id)
+        .order_by(Equipment.id),
+        EquipmentOut,
+        export_format,
+        "my-equipment",
+    )
+
+
+@router.get(
+    "/me/orders",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    summary="Выгрузить свои заказы",
+    description="Потоковая выгрузка заказов текущего пользователя в NDJSON или CSV",
+    responses={
+        200: {"description": "OK"},
+        401: {"description": "Вы не авторизованы"},
+        422: {"description": "Ошибка валидации данных"},
+    },
+)
+async def export_own_orders(
+    export_format: ExportFormat = Query(
+        "ndjson", alias="format", description="Формат выгрузки. ndjson | csv"
+    ),
+    current_user: User = Depends(get_current_user),
+    session_maker: async_sessionmaker[AsyncSession] = Depends(get_read_session_maker),
+) -> StreamingResponse:
+    return export_response(
+        session_maker,
+        select(Order).where(Order.customer_id == current_user.id).order_by(Order.id),
+        OrderOut,
+        export_format,
+        "my-orders",
+    )
@@ -1,23 +1,83 @@
-from fastapi import APIRouter, Body, Depends, HTTPException, Path, Query, status
-from sqlalchemy import select
+import os
+from datetime import UTC, datetime
+from decimal import Decimal
+from typing import Literal
+
+from dotenv import load_dotenv
+from fastapi import (
+    APIRouter,
+    Body,
+    Cookie,
+    Depends,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import contains_eager, selectinload
 
-from app.database import get_session
-from app.models import Equipment, Order, User
-from app.schemas import OrderCreate, OrderOut, OrderOutFull
-from app.supfunctions import get_current_user
+from app import pricing
+from app.availability import as_utc, booking_added, booking_removed
+from app.database import get_read_session, get_session
+from app.idempotency import Idempotency, get_idempotency
+from app.models import Equipment, Order, Reservation, User
+from app.pagination import paginate
+from app.schemas import (
+    IncomingOrderOut,
+    OrderCreate,
+    OrderOut,
+    OrderOutFull,
+    Quote,
+    QuoteLine,
+    QuoteRequest,
+)
+from app.supfunctions import (
+    get_current_user,
+    get_equipment_by_ids,
+    has_admin_role,
+    overlaps,
+    resolve_user_with,
+)
 
 router = APIRouter()
 
+load_dotenv()
+# true - не ждать блокировку оборудования, а сразу отвечать 409
+order_lock_nowait = os.getenv("ORDER_LOCK_NOWAIT", "false").lower() == "true"
+
+# SQLSTATE lock_not_available: строка занята, а FOR UPDATE NOWAIT не ждет
+LOCK_NOT_AVAILABLE = "55P03"
+# SQLSTATE exclusion_violation: нарушено ограничение ex_reservations_equipment_id_period
+EXCLUSION_VIOLATION = "23P01"
+
+
+def already_booked() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Оборудование уже забронировано на эти даты",
+    )
+
 
 async def get_order(
     order_id: int = Path(..., description="ID заказа"),
-    user: User = Depends(get_current_user),
+    session_id: str = Cookie(None),
     session: AsyncSession = Depends(get_session),
 ) -> Order:
-    order = await session.scalar(
-        select(Order).where(Order.id == order_id).options(selectinload(Order.equipment))
+    """Заказ, доступный заказчику, владельцу оборудования или админу.
+
+    Пользователь, заказ и оборудование загружаются одним запросом.
+    """
+    user, (order, _equipment) = await resolve_user_with(
+        session,
+        session_id,
+        (Order, Order.id == order_id),
+        (Equipment, Equipment.id == Order.equipment_id),
+        options=[contains_eager(Order.equipment)],
     )
     if not order:
         raise HTTPException(
@@ -26,7 +86,7 @@ async def get_order(
     if (
         order.customer_id != user.id
         and order.equipment.owner_id != user.id
-        and user.role != "admin"
+        and not await has_admin_role(session, user)
     ):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Заказ недоступен"
@@ -34,19 +94,31 @@ async def get_order(
     return order
 
 
+async def get_read_order(
+    order_id: int = Path(..., description="ID заказа"),
+    session_id: str = Cookie(None),
+    session: AsyncSession = Depends(get_read_session),
+) -> Order:
+    return await get_order(order_id, session_id, session)
+
+
 @router.post(
     "",
     status_code=status.HTTP_201_CREATED,
     response_model=OrderOut,
     summary="Сделать заказ",
-    description="Создает заказ. Нельзя арендовать свое оборудование и оборудование, что уже арендовано",
+    description="Создает заказ на период [start_date, end_date). Нельзя арендовать свое оборудование и оборудование, забронированное на пересекающийся период. Повтор запроса с тем же заголовком Idempotency-Key возвращает первый ответ",
     responses={
         201: {"description": "Заказ успешно сформирован"},
         401: {"description": "Вы не авторизованы"},
         403: {"description": "Вы не можете арендовать свое оборудование"},
         404: {"description": "Оборудование не найдено"},
-        409: {"description": "Оборудование уже арендовано"},
-        422: {"description": "Ошибка валидации данных"},
+        409: {
+            "description": "Оборудование уже забронировано на эти даты, сейчас бронируется другим пользователем или запрос с этим ключом идемпотентности еще выполняется"
+        },
+        422: {
+            "description": "Ошибка валидации данных или ключ идемпотентности использован с другим запросом"
+        },
         500: {"description": "Ошибка со стороны сервера"},
     },
 )
@@ -55,10 +127,26 @@ async def make_order(
     user: User = Depends(get_current_user),
     equipment_id: int = Query(..., description="ID оборудования"),
     session: AsyncSession = Depends(get_session),
+    idempotency: Idempotency = Depends(get_idempotency),
 ) -> OrderOut:
-    equipment = await session.scalar(
-        select(Equipment).where(Equipment.id == equipment_id)
-    )
+    # Блокировка строки оборудования сериализует заказы одного оборудования:
+    # проверка пересечений и вставка выполняются без гонки с параллельными
+    # заказами, а заказы разного оборудования друг друга не ждут.
+    try:
+        equipment = await session.scalar(
+            select(Equipment)
+            .where(Equipment.id == equipment_id)
+            .with_for_update(nowait=order_lock_nowait)
+        )
+    except DBAPIError as exc:
+        await session.rollback()
+        if getattr(exc.orig, "pgcode", None) == LOCK_NOT_AVAILABLE:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Оборудование сейчас бронируется другим пользователем, повторите попытку",
+                headers={"Retry-After": "1"},
+            ) from None
+        raise
     if not equipment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Оборудование не найдено"
@@ -68,26 +156,104 @@ async def make_order(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Вы не можете арендовать свое оборудование",
         )
-    if not equipment.is_available:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT, detail="Оборудование уже арендовано"
+    booked = await session.scalar(
+        select(Reservation.order_id)
+        .where(
+            Reservation.equipment_id == equipment.id,
+            overlaps(order_in.start_date, order_in.end_date),
         )
-    order = Order(
-        **order_in.model_dump(exclude_unset=True),
-        customer_id=user.id,
-        equipment_id=equipment.id,
+        .limit(1)
     )
-    order.total_price = (
-        order.end_date - order.start_date
-    ).days * equipment.price_per_day
-    session.add(order)
+    if booked:
+        raise already_booked()
+    now = datetime.now(UTC)
     try:
+        order = await session.scalar(
+            insert(Order)
+            .values(
+                **order_in.model_dump(exclude_unset=True),
+                customer_id=user.id,
+                equipment_id=equipment.id,
+                total_price=pricing.rental_price(
+                    order_in.start_date, order_in.end_date, equipment.price_per_day
+                ),
+            )
+            .returning(Order)
+        )
+        # Период брони проверяется ограничением на всех заказах оборудования,
+        # а не только в секции orders того же месяца
+        await session.execute(
+            insert(Reservation).values(
+                order_id=order.id,
+                equipment_id=order.equipment_id,
+                start_date=order.start_date,
+                end_date=order.end_date,
+            )
+        )
+        if as_utc(order.start_date) <= now < as_utc(order.end_date):
+            await session.execute(
+                update(Equipment)
+                .where(Equipment.id == equipment.id)
+                .values(is_available=False)
+            )
+        result = OrderOut.model_validate(order)
+        await idempotency.save(result, status.HTTP_201_CREATED)
         await session.commit()
+    except IntegrityError as exc:
+        await session.rollback()
+        # Страховка на случай вставки в обход блокировки
+        if getattr(exc.orig, "pgcode", None) == EXCLUSION_VIOLATION:
+            raise already_booked() from None
+        raise
     except:
         await session.rollback()
         raise
-    await session.refresh(order)
-    return OrderOut.model_validate(order)
+    booking_added(order.equipment_id, order.start_date, order.end_date)
+    return result
+
+
+@router.post(
+    "/quote",
+    status_code=status.HTTP_200_OK,
+    response_model=Quote,
+    summary="Рассчитать стоимость заказов",
+    description="Рассчитывает стоимость аренды для списка позиций (оборудование и период) без оформления заказов. Цены загружаются одним запросом, ненайденные ID оборудования перечисляются в заголовке X-Missing-Ids",
+    responses={
+        200: {"description": "OK"},
+        401: {"description": "Вы не авторизованы"},
+        422: {"description": "Ошибка валидации данных"},
+    },
+)
+async def quote_orders(
+    response: Response,
+    quote_in: QuoteRequest = Body(..., description="Позиции для расчета"),
+    _user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session),
+) -> Quote:
+    equipment_list, missing = await get_equipment_by_ids(
+        session, [item.equipment_id for item in quote_in.items]
+    )
+    if missing:
+        response.headers["X-Missing-Ids"] = ",".join(map(str, missing))
+    prices = {equipment.id: equipment.price_per_day for equipment in equipment_list}
+    lines = [
+        QuoteLine(
+            equipment_id=item.equipment_id,
+            start_date=item.start_date,
+            end_date=item.end_date,
+            price_per_day=prices[item.equipment_id],
+            total_price=pricing.rental_price(
+                item.start_date, item.end_date, prices[item.equipment_id]
+            ),
+        )
+        for item in quote_in.items
+        if item.equipment_id in prices
+    ]
+    return Quote(
+        items=lines,
+        total_price=sum((line.total_price for line in lines), Decimal(0)),
+        partial_day_rule=pricing.partial_day_rule,
+    )
 
 
 @router.get(
@@ -95,26 +261,113 @@ async def make_order(
     status_code=status.HTTP_200_OK,
     response_model=list[OrderOutFull],
     summary="Смотреть свои заказы",
-    description="Выводит список заказов пользователя",
+    description="Выводит список заказов пользователя, новые первыми. Следующая страница запрашивается по курсору из заголовка X-Next-Cursor (или Link)",
     responses={
         200: {"description": "OK"},
+        400: {"description": "Некорректный курсор"},
         401: {"description": "Вы не авторизованы"},
         422: {"description": "Ошибка валидации данных"},
     },
 )
 async def get_orders(
-    user: User = Depends(get_current_user), session: AsyncSession = Depends(get_session)
+    request: Request,
+    response: Response,
+    limit: int = Query(10, ge=1, le=100, description="Количество выводимых заказов"),
+    cursor: str | None = Query(
+        None,
+        description="Курсор следующей страницы из заголовка X-Next-Cursor предыдущего ответа",
+    ),
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session),
 ) -> list[OrderOutFull]:
-    orders = (
-        await session.scalars(
-            select(Order)
-            .where(Order.customer_id == user.id)
-            .options(selectinload(Order.equipment))
-        )
-    ).all()
+    orders = await paginate(
+        session,
+        select(Order)
+        .where(Order.customer_id == user.id)
+        .options(selectinload(Order.equipment)),
+        request,
+        response,
+        sort_key="id",
+        column=Order.id,
+        id_column=Order.id,
+        ascending=False,
+        cursor=cursor,
+        limit=limit,
+    )
     return [OrderOutFull.model_validate(order) for order in orders]
 
 
+@router.get(
+    "/incoming",
+    status_code=status.HTTP_200_OK,
+    response_model=list[IncomingOrderOut],
+    summary="Смотреть заказы своего оборудования",
+    description="Выводит заказы оборудования текущего пользователя, отсортированные по дате начала аренды. Следующая страница запрашивается по курсору из заголовка X-Next-Cursor (или Link)",
+    responses={
+        200: {"description": "OK"},
+        400: {"description": "Некорректный курсор"},
+        401: {"description": "Вы не авторизованы"},
+        422: {"description": "Ошибка валидации данных"},
+    },
+)
+async def get_incoming_orders(
+    request: Request,
+    response: Response,
+    start: datetime | None = Query(
+        None, alias="from", description="Заказы, заканчивающиеся после этой даты"
+    ),
+    end: datetime | None = Query(
+        None, alias="to", description="Заказы, начинающиеся до этой даты"
+    ),
+    order_status: Literal["upcoming", "active", "completed"] | None = Query(
+        None,
+        alias="status",
+        description="upcoming - еще не начались, active - идут сейчас, completed - завершены",
+    ),
+    equipment_id: int | None = Query(None, description="ID оборудования"),
+    order: bool = Query(
+        False, description="По возрастанию даты начала - True, обратное - False"
+    ),
+    limit: int = Query(10, ge=1, le=100, description="Количество выводимых заказов"),
+    cursor: str | None = Query(
+        None,
+        description="Курсор следующей страницы из заголовка X-Next-Cursor предыдущего ответа",
+    ),
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session),
+) -> list[IncomingOrderOut]:
+    filters = [Equipment.owner_id == user.id]
+    if start is not None:
+        filters.append(Order.end_date > start)
+    if end is not None:
+        filters.append(Order.start_date < end)
+    if equipment_id is not None:
+        filters.append(Order.equipment_id == equipment_id)
+    now = datetime.now(UTC)
+    if order_status == "upcoming":
+        filters.append(Order.start_date > now)
+    elif order_status == "active":
+        filters.extend([Order.start_date <= now, Order.end_date > now])
+    elif order_status == "completed":
+        filters.append(Order.end_date <= now)
+    orders = await paginate(
+        session,
+        select(Order)
+        .join(Equipment, Equipment.id == Order.equipment_id)
+        .where(*filters)
+        .options(contains_eager(Order.equipment)),
+        request,
+        response,
+        sort_key="start_date",
+        column=Order.start_date,
+        id_column=Order.id,
+        ascending=order,
+        cursor=cursor,
+        limit=limit,
+    )
+    return [IncomingOrderOut.model_validate(incoming) for incoming in orders]
+
+
 @router.get(
     "/{order_id}",
     status_code=status.HTTP_200_OK,
@@ -129,7 +382,7 @@ async def get_orders(
         422: {"description": "Ошибка валидации данных"},
     },
 )
-async def get_order_by_id(order: Order = Depends(get_order)) -> OrderOutFull:
+async def get_order_by_id(order: Order = Depends(get_read_order)) -> OrderOutFull:
     return OrderOutFull.model_validate(order)
 
 
@@ -150,6 +403,7 @@ async def get_order_by_id(order: Order = Depends(get_order)) -> OrderOutFull:
 )
 async def delete_order(
     order: Order = Depends(get_order),
+    # Пользователь уже определен в get_order и берется из кэша без запроса
     user: User = Depends(get_current_user),
     session: AsyncSession = Depends(get_session),
 ):
@@ -159,8 +413,19 @@ async def delete_order(
         )
     try:
         await session.delete(order)
+        await session.execute(
+            delete(Reservation).where(Reservation.order_id == order.id)
+        )
+        # Заказы не пересекаются, поэтому идущий сейчас заказ - единственный
+        if as_utc(order.start_date) <= datetime.now(UTC) < as_utc(order.end_date):
+            await session.execute(
+                update(Equipment)
+                .where(Equipment.id == order.equipment_id)
+                .values(is_available=True)
+            )
         await session.commit()
     except:
         await session.rollback()
         raise
+    booking_removed(order.equipment_id, order.start_date, order.end_date)
     return
@@ -2,6 +2,7 @@ from io import BytesIO
 
 from fastapi import (
     APIRouter,
+    Cookie,
     Depends,
     File,
     HTTPException,
@@ -10,22 +11,32 @@ from fastapi import (
     UploadFile,
     status,
 )
-from sqlalchemy import select
+from sqlalchemy import and_, insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_session
-from app.models import Photo, User
+from app.idempotency import Idempotency, get_idempotency
+from app.models import Equipment, Photo
 from app.schemas import PhotoOut
-from app.supfunctions import get_owner
+from app.supfunctions import check_owner, get_owned_equipment, resolve_user_with
 
 router = APIRouter()
 
 
 async def get_photo(
+    equipment_id: int = Path(..., description="ID оборудования"),
     photo_id: int = Path(..., description="ID фото"),
+    session_id: str = Cookie(None),
     session: AsyncSession = Depends(get_session),
 ) -> Photo:
-    photo = await session.scalar(select(Photo).where(Photo.id == photo_id))
+    """Фото оборудования, доступное владельцу. Проверки - одним запросом"""
+    user, (equipment, photo) = await resolve_user_with(
+        session,
+        session_id,
+        (Equipment, Equipment.id == equipment_id),
+        (Photo, and_(Photo.id == photo_id, Photo.equipment_id == Equipment.id)),
+    )
+    await check_owner(session, user, equipment)
     if not photo:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Фото не найдено"
@@ -62,15 +73,19 @@ async def upload_photo(
     status_code=status.HTTP_201_CREATED,
     response_model=PhotoOut,
     summary="Добавить фото",
-    description="Добавляет приложение к оборудованию в формате картинки. Доступно только владельцу оборудования",
+    description="Добавляет приложение к оборудованию в формате картинки. Доступно только владельцу оборудования. Повтор запроса с тем же заголовком Idempotency-Key возвращает первый ответ",
     responses={
         204: {"description": "Фото приложено"},
         401: {"description": "Вы не авторизованы"},
         403: {"description": "Вы не владелец данного оборудования"},
         404: {"description": "Оборудование не найдено"},
-        409: {"description": "Некорректная вставка данных в БД"},
+        409: {
+            "description": "Некорректная вставка данных в БД или запрос с этим ключом идемпотентности еще выполняется"
+        },
         413: {"description": "Размер файла не должен превышать 2 МБ"},
-        422: {"description": "Ошибка валидации данных"},
+        422: {
+            "description": "Ошибка валидации данных или ключ идемпотентности использован с другим запросом"
+        },
         500: {"description": "Ошибка со стороны сервера"},
     },
 )
@@ -78,20 +93,28 @@ async def add_photo(
     equipment_id: int = Path(
         ..., description="ID оборудования, к которому прилагается новое фото"
     ),
-    _owner: User = Depends(get_owner),
+    _equipment: Equipment = Depends(get_owned_equipment),
     file: tuple[bytes, str] = Depends(upload_photo),
     session: AsyncSession = Depends(get_session),
+    idempotency: Idempotency = Depends(get_idempotency),
 ) -> PhotoOut:
     content, filename = file
-    photo = Photo(filename=filename, content=content, equipment_id=equipment_id)
-    session.add(photo)
     try:
+        # Возвращаем только метаданные, содержимое файла обратно не читаем
+        photo = (
+            await session.execute(
+                insert(Photo)
+                .values(filename=filename, content=content, equipment_id=equipment_id)
+                .returning(Photo.id, Photo.filename, Photo.equipment_id)
+            )
+        ).one()
+        result = PhotoOut.model_validate(photo)
+        await idempotency.save(result, status.HTTP_201_CREATED)
         await session.commit()
-        await session.refresh(photo)
     except:
         await session.rollback()
         raise
-    return PhotoOut.model_validate(photo)
+    return result
 
 
 @router.get(
@@ -108,7 +131,7 @@ async def add_photo(
     },
 )
 async def get_photo_info(
-    _owner: User = Depends(get_owner), photo: Photo = Depends(get_photo)
+    photo: Photo = Depends(get_photo),
 ):
     return PhotoOut.model_validate(photo)
 
@@ -127,7 +150,7 @@ async def get_photo_info(
     },
 )
 async def get_photo_content(
-    _owner: User = Depends(get_owner), photo: Photo = Depends(get_photo)
+    photo: Photo = Depends(get_photo),
 ):
     return Response(
         content=photo.content,
@@ -153,20 +176,21 @@ async def get_photo_content(
     },
 )
 async def update_photo(
-    _owner: User = Depends(get_owner),
     photo: Photo = Depends(get_photo),
     file: tuple[bytes, str] = Depends(upload_photo),
     session: AsyncSession = Depends(get_session),
 ):
     content, filename = file
-    photo.content = content
-    photo.filename = filename
     try:
+        await session.execute(
+            update(Photo)
+            .where(Photo.id == photo.id)
+            .values(content=content, filename=filename)
+        )
         await session.commit()
     except:
         await session.rollback()
         raise
-    await session.refresh(photo)
     return {"Сообщение": "Фото успешно изменено"}
 
 
@@ -184,7 +208,6 @@ async def update_photo(
     },
 )
 async def delete_photo(
-    _owner: User = Depends(get_owner),
     photo: Photo = Depends(get_photo),
     session: AsyncSession = Depends(get_session),
 ):
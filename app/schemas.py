@@ -48,18 +48,22 @@ class UserOut(BaseModel):
 class EquipmentCreate(BaseModel):
     title: str = Field(
         ...,
+        max_length=200,
         title="Наименование",
-        description="Должно быть заполнено",
+        description="Должно быть заполнено. Максимальный размер - 200 знаков.",
         examples=["Кофеварка", "Принтер"],
     )
     description: str = Field(
         ...,
+        max_length=1000,
         title="Описание",
         description="Должно быть заполнено. Максимальный размер - 1000 знаков.",
         examples=["Huevo. Кофеварка бла-бла-бла", "Canyon. Принтер HFDFSVFV-3434"],
     )
     price_per_day: Decimal = Field(
         ...,
+        max_digits=10,
+        decimal_places=2,
         title="Стоимость одного дня аренды",
         description="Должно быть заполнено. Сумма не должна быть отрицательной",
         examples=[100.00, 200.00],
@@ -84,13 +88,21 @@ class EquipmentCreate(BaseModel):
 
 class EquipmentUpdate(BaseModel):
     title: str | None = Field(
-        None, title="Наименование", description="Заполнить, чтобы изменить"
+        None,
+        max_length=200,
+        title="Наименование",
+        description="Заполнить, чтобы изменить",
     )
     description: str | None = Field(
-        None, title="Описание", description="Заполнить, чтобы изменить"
+        None,
+        max_length=1000,
+        title="Описание",
+        description="Заполнить, чтобы изменить",
     )
     price_per_day: Decimal | None = Field(
         None,
+        max_digits=10,
+        decimal_places=2,
         title="Стоимость одного дня аренды",
         description="Заполнить, чтобы изменить",
     )
@@ -111,6 +123,42 @@ class EquipmentOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class EquipmentIds(BaseModel):
+    ids: list[int] = Field(
+        ...,
+        min_length=1,
+        max_length=1000,
+        title="Список ID оборудования",
+        examples=[[3, 1, 2]],
+    )
+
+
+class AvailabilityInterval(BaseModel):
+    start: datetime = Field(..., title="Начало периода")
+    end: datetime = Field(..., title="Конец периода (не включается)")
+
+
+class Availability(BaseModel):
+    equipment_id: int = Field(..., title="ID оборудования")
+    start: datetime = Field(..., title="Начало запрошенного периода")
+    end: datetime = Field(..., title="Конец запрошенного периода")
+    busy: list[AvailabilityInterval] = Field(..., title="Занятые периоды")
+    free: list[AvailabilityInterval] = Field(..., title="Свободные периоды")
+
+
+class ImportRowError(BaseModel):
+    row: int = Field(
+        ..., title="Номер строки данных", description="Без учета заголовка CSV"
+    )
+    detail: str = Field(..., title="Причина ошибки")
+
+
+class ImportResult(BaseModel):
+    inserted: int = Field(..., title="Количество добавленного оборудования")
+    failed: int = Field(..., title="Количество строк с ошибками")
+    errors: list[ImportRowError] = Field(..., title="Ошибки по строкам")
+
+
 class EquipmentOutbyCategory(BaseModel):
     id: int = Field(..., title="ID оборудования")
     title: str = Field(..., title="Наименование")
@@ -152,13 +200,30 @@ class CategoryOutSimple(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class CategorySummary(BaseModel):
+    equipment_count: int = Field(..., title="Количество оборудования")
+    available_count: int = Field(..., title="Количество доступного оборудования")
+    min_price: Decimal | None = Field(
+        ..., title="Минимальная стоимость одного дня аренды"
+    )
+    max_price: Decimal | None = Field(
+        ..., title="Максимальная стоимость одного дня аренды"
+    )
+
+
 class CategoryOutFull(BaseModel):
     id: int = Field(..., title="ID категории")
     title: str = Field(..., title="Название категории")
+    summary: CategorySummary = Field(..., title="Сводка по оборудованию категории")
     equipment: list[EquipmentOutbyCategory] = Field(
         ...,
         title="Список оборудования",
-        description="Список оборудования, входящего в данную категорию",
+        description="Страница оборудования, входящего в данную категорию, по возрастанию ID",
+    )
+    next_cursor: str | None = Field(
+        None,
+        title="Курсор следующей страницы оборудования",
+        description="Передается в параметре cursor. Отсутствует на последней странице",
     )
 
     model_config = ConfigDict(from_attributes=True)
@@ -184,6 +249,32 @@ class OrderCreate(BaseModel):
         return end_date
 
 
+class QuoteItem(OrderCreate):
+    equipment_id: int = Field(..., title="ID оборудования")
+
+
+class QuoteRequest(BaseModel):
+    items: list[QuoteItem] = Field(
+        ..., min_length=1, max_length=1000, title="Позиции для расчета"
+    )
+
+
+class QuoteLine(BaseModel):
+    equipment_id: int = Field(..., title="ID оборудования")
+    start_date: datetime = Field(..., title="Дата начала аренды")
+    end_date: datetime = Field(..., title="Дата окончания аренды")
+    price_per_day: Decimal = Field(..., title="Цена за день")
+    total_price: Decimal = Field(..., title="Стоимость")
+
+
+class Quote(BaseModel):
+    items: list[QuoteLine] = Field(..., title="Расчет по позициям")
+    total_price: Decimal = Field(..., title="Общая стоимость")
+    partial_day_rule: str = Field(
+        ..., title="Правило учета неполных суток", examples=["floor"]
+    )
+
+
 class OrderOut(BaseModel):
     id: int = Field(..., title="ID заказа")
     customer_id: int = Field(..., title="ID заказчика")
@@ -195,6 +286,10 @@ class OrderOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class IncomingOrderOut(OrderOut):
+    equipment: EquipmentOut = Field(..., title="Арендованное оборудование")
+
+
 class OrderOutFull(BaseModel):
     id: int = Field(..., title="ID заказа")
     start_date: datetime = Field(..., title="Дата начала аренды")
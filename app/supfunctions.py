@@ -1,28 +1,116 @@
-from fastapi import Cookie, Depends, HTTPException, Path, status
-from sqlalchemy import select
+from collections.abc import Sequence
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+
+from fastapi import Cookie, Depends, HTTPException, Path, Query, status
+from sqlalchemy import (
+    ARRAY,
+    ColumnElement,
+    Integer,
+    Update,
+    and_,
+    any_,
+    bindparam,
+    select,
+    update,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.base import ExecutableOption
+
+from app import tokens
+from app.cache import session_cache
+from app.database import get_read_session, get_session
+from app.models import Category, Equipment, Reservation, Session, User
+
+
+def unauthorized() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED, detail="Вы не авторизованы"
+    )
+
+
+async def known_user(session_id: str | None, session: AsyncSession) -> User | None:
+    """Пользователь, которого можно определить без запроса к БД"""
+    if tokens.auth_mode == "signed":
+        await tokens.refresh_deny_list(session)
+        claims = tokens.read_token(session_id)
+        if not claims:
+            raise unauthorized()
+        return tokens.user_from_claims(claims)
+    return session_cache.get(session_id) if session_id else None
 
-from app.database import get_session
-from app.models import Equipment, Session, User
+
+async def resolve_user_with(
+    session: AsyncSession,
+    session_id: str | None,
+    *targets: tuple[type, ColumnElement[bool]],
+    options: Sequence[ExecutableOption] = (),
+) -> tuple[User, list]:
+    """Определяет пользователя и загружает целевые строки одним запросом.
+
+    targets - пары (модель, условие присоединения), присоединяются LEFT JOIN'ом,
+    поэтому ненайденная строка приходит как None. options - опции загрузки,
+    например contains_eager для связей между targets. Если пользователь уже
+    известен (кэш или подписанный токен), запрашиваются только целевые строки.
+    """
+    entities = [entity for entity, _ in targets]
+    user = await known_user(session_id, session)
+    if user:
+        if not targets:
+            return user, []
+        (first, condition), *rest = targets
+        stmt = select(*entities).select_from(first).where(condition)
+        for entity, onclause in rest:
+            stmt = stmt.outerjoin(entity, onclause)
+        row = (await session.execute(stmt.options(*options))).first()
+        return user, list(row) if row else [None] * len(targets)
+
+    now = datetime.now(UTC)
+    stmt = (
+        select(User, Session.created_at, *entities)
+        .join(Session, Session.user_id == User.id)
+        .where(
+            Session.id == session_id,
+            Session.created_at > now - timedelta(seconds=tokens.session_ttl),
+        )
+    )
+    for entity, onclause in targets:
+        stmt = stmt.outerjoin(entity, onclause)
+    row = (await session.execute(stmt.options(*options))).first()
+    if not row:
+        raise unauthorized()
+    user, created_at, *found = row
+    # SQLite возвращает время без часового пояса
+    created_at = created_at.replace(tzinfo=created_at.tzinfo or UTC)
+    expires_in = tokens.session_ttl - (now - created_at).total_seconds()
+    # Отвязываем от сессии БД, чтобы объект можно было отдавать другим запросам
+    session.expunge(user)
+    session_cache.set(session_id, user, ttl=min(session_cache.ttl, expires_in))
+    return user, found
 
 
 async def get_current_user(
     session_id: str = Cookie(None), session: AsyncSession = Depends(get_session)
 ) -> User:
-    user = await session.scalar(
-        select(User)
-        .join(Session, Session.user_id == User.id)
-        .where(Session.id == session_id)
-    )
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Вы не авторизованы"
-        )
+    user, _ = await resolve_user_with(session, session_id)
     return user
 
 
-async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
-    if current_user.role != "admin":
+async def has_admin_role(session: AsyncSession, user: User) -> bool:
+    """В режиме signed роль в токене могла устареть: пользователя повысили уже
+    после выдачи токена. Поэтому права администратора проверяются по БД
+    """
+    if tokens.auth_mode != "signed":
+        return user.role == "admin"
+    role = await session.scalar(select(User.role).where(User.id == user.id))
+    return role == "admin"
+
+
+async def get_current_admin(
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+) -> User:
+    if not await has_admin_role(session, current_user):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="У вас нет прав администратора",
@@ -44,16 +132,105 @@ async def get_equipment(
     return equipment
 
 
-async def get_owner(
-    equipment: Equipment = Depends(get_equipment),
-    current_user: User = Depends(get_current_user),
-) -> User:
-    if equipment.owner_id != current_user.id and current_user.role != "admin":
+async def get_read_equipment(
+    equipment_id: int = Path(..., description="ID оборудования"),
+    session: AsyncSession = Depends(get_read_session),
+) -> Equipment:
+    return await get_equipment(equipment_id, session)
+
+
+def overlaps(start: datetime, end: datetime) -> ColumnElement[bool]:
+    """Бронь пересекается с периодом [start, end), как tstzrange в ограничении.
+
+    Брони читаются из несекционированной reservations: запрос по orders
+    проверял бы все секции старше периода.
+    """
+    return and_(Reservation.start_date < end, Reservation.end_date > start)
+
+
+max_batch_ids = 1000
+
+
+async def get_equipment_by_ids(
+    session: AsyncSession, ids: list[int]
+) -> tuple[list[Equipment], list[int]]:
+    """Оборудование одним запросом в порядке запрошенных ID и список ненайденных ID"""
+    ids = list(dict.fromkeys(ids))
+    if session.get_bind().dialect.name == "postgresql":
+        # Один параметр-массив вместо IN (...): текст запроса не зависит от
+        # количества ID, и подготовленное выражение переиспользуется
+        condition = Equipment.id == any_(bindparam("ids", ids, type_=ARRAY(Integer)))
+    else:
+        condition = Equipment.id.in_(ids)
+    found = {
+        equipment.id: equipment
+        for equipment in await session.scalars(select(Equipment).where(condition))
+    }
+    return [found[id_] for id_ in ids if id_ in found], [
+        id_ for id_ in ids if id_ not in found
+    ]
+
+
+async def check_owner(
+    session: AsyncSession, user: User, equipment: Equipment | None
+) -> Equipment:
+    if not equipment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Оборудование не найдено"
+        )
+    if equipment.owner_id != user.id and not await has_admin_role(session, user):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Вы не владелец данного оборудования",
         )
-    return current_user
+    return equipment
+
+
+async def get_owned_equipment(
+    equipment_id: int = Path(..., description="ID оборудования"),
+    session_id: str = Cookie(None),
+    session: AsyncSession = Depends(get_session),
+) -> Equipment:
+    """Оборудование, доступное текущему пользователю как владельцу или админу"""
+    user, (equipment,) = await resolve_user_with(
+        session, session_id, (Equipment, Equipment.id == equipment_id)
+    )
+    return await check_owner(session, user, equipment)
+
+
+def equipment_filters(
+    min_price: Decimal | None = Query(
+        None, ge=0, description="Минимальная стоимость одного дня аренды"
+    ),
+    max_price: Decimal | None = Query(
+        None, ge=0, description="Максимальная стоимость одного дня аренды"
+    ),
+    is_available: bool | None = Query(None, description="Доступность оборудования"),
+    owner_id: int | None = Query(None, description="ID владельца"),
+    category_id: int | None = Query(None, description="ID категории"),
+) -> list[ColumnElement[bool]]:
+    """Условия WHERE по переданным фильтрам. Не заданные фильтры не применяются"""
+    filters = []
+    if min_price is not None:
+        filters.append(Equipment.price_per_day >= min_price)
+    if max_price is not None:
+        filters.append(Equipment.price_per_day <= max_price)
+    if is_available is not None:
+        filters.append(Equipment.is_available == is_available)
+    if owner_id is not None:
+        filters.append(Equipment.owner_id == owner_id)
+    if category_id is not None:
+        filters.append(Equipment.category_id == category_id)
+    return filters
+
+
+def change_equipment_count(category_id: int, delta: int) -> Update:
+    """Выражение для счетчика оборудования категории, выполняется в той же транзакции"""
+    return (
+        update(Category)
+        .where(Category.id == category_id)
+        .values(equipment_count=Category.equipment_count + delta)
+    )
 
 
 sortdict = {
@@ -62,4 +239,5 @@ sortdict = {
     "available": Equipment.is_available,
     "owner": Equipment.owner_id,
     "category": Equipment.category_id,
+    "price": Equipment.price_per_day,
 }
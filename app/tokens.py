@@ -0,0 +1,110 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+from datetime import UTC, datetime
+from time import monotonic, time
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import RevokedToken, User
+
+load_dotenv()
+
+# session - непрозрачный session_id в таблице sessions (по умолчанию),
+# signed - подписанный HMAC токен, проверяемый без обращения к БД
+auth_mode = os.getenv("AUTH_MODE", "session")
+token_secret = os.getenv("SESSION_SECRET", "").encode()
+# Значения-заглушки из примеров конфигурации
+placeholder_secrets = {b"your_long_random_secret", b"changeme", b"secret"}
+min_secret_length = 32
+if auth_mode == "signed" and (
+    len(token_secret) < min_secret_length or token_secret in placeholder_secrets
+):
+    raise RuntimeError(
+        f"SESSION_SECRET must be a random string of at least {min_secret_length} characters"
+    )
+session_ttl = int(os.getenv("SESSION_TTL", 7 * 24 * 3600))
+deny_list_refresh = float(os.getenv("DENY_LIST_REFRESH", 30))
+
+# jti отозванных, но еще не истекших токенов
+deny_list: set[str] = set()
+deny_list_loaded_at: float | None = None
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(token_secret, payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(user: User) -> str:
+    payload = _b64encode(
+        json.dumps(
+            {
+                "uid": user.id,
+                "name": user.username,
+                "role": user.role,
+                "exp": int(time()) + session_ttl,
+                "jti": secrets.token_hex(16),
+            },
+            separators=(",", ":"),
+        ).encode()
+    )
+    return f"{payload}.{_sign(payload)}"
+
+
+def read_token(token: str | None) -> dict | None:
+    """Возвращает содержимое токена, если подпись верна и срок не истек"""
+    if not token or token.count(".") != 1:
+        return None
+    payload, signature = token.split(".")
+    if not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if claims["exp"] <= time() or claims["jti"] in deny_list:
+        return None
+    return claims
+
+
+def user_from_claims(claims: dict) -> User:
+    return User(id=claims["uid"], username=claims["name"], role=claims["role"])
+
+
+async def refresh_deny_list(session: AsyncSession) -> None:
+    """Подгружает отозванные токены из БД не чаще раза в DENY_LIST_REFRESH секунд"""
+    global deny_list_loaded_at
+    if (
+        deny_list_loaded_at is not None
+        and monotonic() - deny_list_loaded_at < deny_list_refresh
+    ):
+        return
+    deny_list_loaded_at = monotonic()
+    jtis = await session.scalars(
+        select(RevokedToken.jti).where(RevokedToken.expires_at > datetime.now(UTC))
+    )
+    deny_list.clear()
+    deny_list.update(jtis)
+
+
+def revoke(session: AsyncSession, claims: dict) -> None:
+    """Добавляет токен в deny-list. Запись в БД сохраняется коммитом вызывающего"""
+    deny_list.add(claims["jti"])
+    session.add(
+        RevokedToken(
+            jti=claims["jti"], expires_at=datetime.fromtimestamp(claims["exp"], UTC)
+        )
+    )
@@ -0,0 +1,94 @@
+"""Задержка посторонних эндпоинтов во время шторма логинов.
+
+Поднимает приложение в процессе на SQLite в памяти, запускает параллельные
+логины и одновременно опрашивает GET /categories. Печатает p50/p99 задержки
+GET-запросов. С флагом --inline bcrypt вызывается прямо в event loop, как было
+раньше, что позволяет сравнить оба режима.
+
+Запуск из корня проекта:
+    python -m benchmarks.login_storm --logins 200 --probes 200
+    python -m benchmarks.login_storm --logins 200 --probes 200 --inline
+"""
+
+import argparse
+import asyncio
+import statistics
+from time import perf_counter
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import app, passwords
+from app.database import get_session
+from app.models import Base
+
+
+async def run_inline(func, *args):
+    return func(*args)
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def main(logins: int, probes: int, inline: bool) -> None:
+    if inline:
+        passwords.run_in_password_pool = run_inline
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def override_get_session():
+        async with session_maker() as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/register", json={"username": "bench", "password": "pw"})
+        await client.post("/login", json={"username": "bench", "password": "pw"})
+        cookie = {"Cookie": f"session_id={client.cookies['session_id']}"}
+
+        async def storm() -> list[int]:
+            async with AsyncClient(transport=transport, base_url="http://bench") as c:
+                responses = await asyncio.gather(
+                    *(
+                        c.post("/login", json={"username": "bench", "password": "pw"})
+                        for _ in range(logins)
+                    )
+                )
+            return [response.status_code for response in responses]
+
+        async def probe() -> list[float]:
+            latencies = []
+            for _ in range(probes):
+                start = perf_counter()
+                await client.get("/categories", headers=cookie)
+                latencies.append((perf_counter() - start) * 1000)
+                await asyncio.sleep(0.005)
+            return latencies
+
+        codes, latencies = await asyncio.gather(storm(), probe())
+
+    app.dependency_overrides.clear()
+    await engine.dispose()
+    print(f"mode: {'inline' if inline else 'pool'}")
+    print(
+        f"logins: {codes.count(200)} ok, {codes.count(503)} rejected with 503, "
+        f"{len(codes)} total"
+    )
+    print(
+        f"GET /categories: p50={statistics.median(latencies):.1f}ms "
+        f"p99={percentile(latencies, 0.99):.1f}ms max={max(latencies):.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--inline", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.probes, args.inline))
@@ -0,0 +1,135 @@
+"""Шторм параллельных заказов одного оборудования.
+
+Поднимает приложение в процессе поверх PostgreSQL (таблицы пересоздаются!),
+отправляет одновременно --orders заказов одного оборудования на случайные
+периоды и печатает пропускную способность, распределение ответов и число
+пересекающихся броней в БД - оно должно быть равно нулю. С флагом --nowait
+заказы не ждут блокировку оборудования, а сразу получают 409. Флаг
+--no-constraint удаляет ограничение ex_reservations_equipment_id_period, чтобы
+проверить, что от двойных броней защищает сама блокировка строки.
+
+Запуск из корня проекта:
+    python -m benchmarks.order_storm --url postgresql+asyncpg://... --orders 500
+    python -m benchmarks.order_storm --url postgresql+asyncpg://... --nowait
+    python -m benchmarks.order_storm --url postgresql+asyncpg://... --no-constraint
+"""
+
+import argparse
+import asyncio
+import random
+from collections import Counter
+from datetime import UTC, datetime, timedelta
+from time import perf_counter
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import app
+from app.database import get_session
+from app.models import Base, Category, Equipment, Session, User
+from app.routers import orders
+
+
+async def main(url: str, count: int, days: int, nowait: bool, constraint: bool) -> None:
+    orders.order_lock_nowait = nowait
+    engine = create_async_engine(url, pool_size=20, max_overflow=20)
+    session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await conn.run_sync(Base.metadata.create_all)
+        if not constraint:
+            await conn.execute(
+                text(
+                    "ALTER TABLE reservations"
+                    " DROP CONSTRAINT ex_reservations_equipment_id_period"
+                )
+            )
+        await conn.execute(
+            insert(User),
+            [
+                {"username": "owner", "hashed_password": b"-"},
+                {"username": "customer", "hashed_password": b"-"},
+            ],
+        )
+        await conn.execute(insert(Session), [{"id": "storm", "user_id": 2}])
+        await conn.execute(insert(Category), [{"title": "storm"}])
+        await conn.execute(
+            insert(Equipment),
+            [
+                {
+                    "title": "popular",
+                    "description": "storm",
+                    "price_per_day": 100,
+                    "owner_id": 1,
+                    "category_id": 1,
+                }
+            ],
+        )
+
+    async def override_get_session():
+        async with session_maker() as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    first_day = datetime(2030, 1, 1, tzinfo=UTC)
+
+    def order_body() -> dict:
+        start = first_day + timedelta(days=random.randrange(days))
+        end = start + timedelta(days=random.randint(1, 5))
+        return {"start_date": start.isoformat(), "end_date": end.isoformat()}
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app),
+        base_url="http://bench",
+        cookies={"session_id": "storm"},
+    ) as client:
+        await client.get("/me")
+        start = perf_counter()
+        responses = await asyncio.gather(
+            *(
+                client.post("/orders?equipment_id=1", json=order_body())
+                for _ in range(count)
+            )
+        )
+        elapsed = perf_counter() - start
+
+    async with engine.connect() as conn:
+        double_booked = await conn.scalar(
+            text(
+                "SELECT count(*) FROM orders a JOIN orders b"
+                " ON a.equipment_id = b.equipment_id AND a.id < b.id"
+                " AND tstzrange(a.start_date, a.end_date)"
+                " && tstzrange(b.start_date, b.end_date)"
+            )
+        )
+    app.dependency_overrides.clear()
+    await engine.dispose()
+
+    codes = Counter(response.status_code for response in responses)
+    print(
+        f"mode: {'nowait' if nowait else 'wait'}, "
+        f"constraint: {'on' if constraint else 'off'}"
+    )
+    print(f"{count} orders in {elapsed:.2f}s: {count / elapsed:.0f} req/s")
+    print(
+        "responses: " + ", ".join(f"{code}: {n}" for code, n in sorted(codes.items()))
+    )
+    print(f"overlapping bookings in DB: {double_booked}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", required=True, help="postgresql+asyncpg://...")
+    parser.add_argument("--orders", type=int, default=300)
+    parser.add_argument(
+        "--days", type=int, default=60, help="Разброс дат начала заказов"
+    )
+    parser.add_argument("--nowait", action="store_true")
+    parser.add_argument("--no-constraint", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(
+        main(args.url, args.orders, args.days, args.nowait, not args.no_constraint)
+    )
@@ -3,7 +3,7 @@ from fastapi import FastAPI
 from httpx import ASGITransport, AsyncClient
 
 from app import app
-from app.database import get_session
+from app.database import get_session, get_session_maker
 from app.models import Base
 from tests.db_test import Async_Session_Test, engine_test
 
@@ -33,6 +33,7 @@ async def test_app(async_session):
         yield async_session
 
     app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_session_maker] = lambda: Async_Session_Test
     yield app
     app.dependency_overrides.clear()
 
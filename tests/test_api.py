@@ -1,9 +1,21 @@
+import asyncio
 import io
+import json
 import os
+from datetime import UTC, datetime, timedelta
 
 import pytest
 from dotenv import load_dotenv
 from httpx import AsyncClient
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import database, passwords, pricing, tokens
+from app.availability import booking_added, build_calendar, build_versions
+from app.cache import calendar_cache, session_cache
+from app.maintenance import refresh_availability, sweep_expired
+from app.models import Equipment, IdempotencyKey, Order, Session, User
+from tests.db_test import Async_Session_Test
 
 
 # Тесты auth.py
@@ -27,6 +39,20 @@ async def test_login_n_logout(client: AsyncClient):
     assert len(response.cookies) == 0
 
 
+@pytest.mark.asyncio
+async def test_logout_invalidates_cached_session(client: AsyncClient):
+    response = await client.post(
+        "/login", json={"username": "Apollo", "password": "123"}
+    )
+    session_id = response.cookies["session_id"]
+    await client.get("/me")
+    assert session_cache.get(session_id) is not None
+    await client.delete("/logout")
+    assert session_cache.get(session_id) is None
+    response = await client.get("/me", headers={"Cookie": f"session_id={session_id}"})
+    assert response.status_code == 401
+
+
 @pytest.mark.asyncio
 async def test_me(authorized_client: AsyncClient):
     response = await authorized_client.get("/me")
@@ -47,6 +73,45 @@ async def test_invalid_password(client: AsyncClient):
     assert response.status_code == 401
 
 
+@pytest.mark.asyncio
+async def test_login_when_password_pool_is_full(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(passwords, "slots", asyncio.Semaphore(0))
+    response = await client.post(
+        "/login", json={"username": "Apollo", "password": "123"}
+    )
+    assert response.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_signed_token_mode(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(tokens, "auth_mode", "signed")
+    monkeypatch.setattr(tokens, "token_secret", b"test-secret")
+    response = await client.post(
+        "/login", json={"username": "Apollo", "password": "123"}
+    )
+    token = response.cookies["session_id"]
+    response = await client.get("/me")
+    assert response.json()["username"] == "Apollo"
+    await client.delete("/logout")
+    response = await client.get("/me", headers={"Cookie": f"session_id={token}"})
+    assert response.status_code == 401
+    response = await client.get("/me", headers={"Cookie": f"session_id={token}x"})
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_expired_session(client: AsyncClient, async_session: AsyncSession):
+    expired_at = datetime.now(UTC) - timedelta(seconds=tokens.session_ttl + 60)
+    async_session.add(Session(id="expired", user_id=1, created_at=expired_at))
+    await async_session.commit()
+    response = await client.get("/me", headers={"Cookie": "session_id=expired"})
+    assert response.status_code == 401
+    assert await sweep_expired(Async_Session_Test) >= 1
+    assert not await async_session.scalar(
+        select(Session).where(Session.id == "expired")
+    )
+
+
 # Тесты admin.py
 load_dotenv()
 root_pass = os.getenv("ROOT_PASSWORD")
@@ -60,6 +125,62 @@ async def test_promote_to_admin(admin_client: AsyncClient):
     assert response.status_code == 200
 
 
+@pytest.mark.asyncio
+async def test_promote_to_admin_signed_mode(
+    client: AsyncClient, async_session: AsyncSession, monkeypatch
+):
+    # Токен выдан до повышения, но права администратора действуют без перевхода
+    monkeypatch.setattr(tokens, "auth_mode", "signed")
+    monkeypatch.setattr(tokens, "token_secret", b"test-secret")
+    await client.post("/login", json={"username": "Noownerollo", "password": "789"})
+    response = await client.get("/admin/metrics")
+    assert response.status_code == 403
+    response = await client.put(
+        "/admin/promote-to-admin/3", json={"password": root_pass}
+    )
+    assert response.status_code == 200
+    response = await client.get("/admin/metrics")
+    assert response.status_code == 200
+    await client.delete("/logout")
+
+    await async_session.execute(update(User).where(User.id == 3).values(role="user"))
+    await async_session.commit()
+
+
+@pytest.mark.asyncio
+async def test_promote_to_admin_clears_cached_session(
+    client: AsyncClient, async_session: AsyncSession
+):
+    response = await client.post(
+        "/login", json={"username": "Noownerollo", "password": "789"}
+    )
+    session_id = response.cookies["session_id"]
+    await client.get("/me")
+    assert session_cache.get(session_id).role == "user"
+    response = await client.get("/admin/metrics")
+    assert response.status_code == 403
+    response = await client.put(
+        "/admin/promote-to-admin/3", json={"password": root_pass}
+    )
+    assert response.status_code == 200
+    response = await client.get("/admin/metrics")
+    assert response.status_code == 200
+    await client.delete("/logout")
+
+    await async_session.execute(update(User).where(User.id == 3).values(role="user"))
+    await async_session.commit()
+
+
+@pytest.mark.asyncio
+async def test_get_metrics(admin_client: AsyncClient):
+    await admin_client.get("/me")
+    response = await admin_client.get("/admin/metrics")
+    data = response.json()
+    assert response.status_code == 200
+    assert data["session_cache"]["hits"] >= 1
+    assert "checkout" in data["db_pool"]
+
+
 @pytest.mark.asyncio
 async def test_add_category_from_admin(admin_client: AsyncClient):
     response = await admin_client.post("/categories", json={"title": "Бытовые приборы"})
@@ -151,6 +272,187 @@ async def test_get_list_of_equipment(authorized_client: AsyncClient):
     assert isinstance(data, list)
 
 
+@pytest.mark.asyncio
+async def test_replica_set_round_robin_and_health():
+    replica_set = database.ReplicaSet(
+        ["sqlite+aiosqlite:///:memory:", "sqlite+aiosqlite:///:memory:"]
+    )
+    first, second = replica_set.session_makers
+    assert [replica_set.pick() for _ in range(3)] == [first, second, first]
+    replica_set.healthy[0] = False
+    assert [replica_set.pick() for _ in range(2)] == [second, second]
+    replica_set.healthy[1] = False
+    assert replica_set.pick() is None
+
+    broken = database.ReplicaSet(
+        ["sqlite+aiosqlite:///:memory:", "sqlite+aiosqlite:////nonexistent/replica.db"]
+    )
+    await broken.check()
+    assert broken.healthy == [True, False]
+    for replica in replica_set.engines + broken.engines:
+        await replica.dispose()
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_replica_until_write(
+    authorized_client: AsyncClient, monkeypatch
+):
+    replica_reads = []
+
+    def replica_session():
+        replica_reads.append(1)
+        return Async_Session_Test()
+
+    replicas = database.replicas
+    monkeypatch.setattr(replicas, "engines", [database.engine])
+    monkeypatch.setattr(replicas, "session_makers", [replica_session])
+    monkeypatch.setattr(replicas, "healthy", [True])
+
+    await authorized_client.get("/equipment")
+    assert len(replica_reads) == 1
+    # После POST чтение какое-то время идет с основной БД
+    response = await authorized_client.post("/equipment/batch", json={"ids": [1]})
+    assert database.sticky_cookie in response.cookies
+    assert len(replica_reads) == 2
+    await authorized_client.get("/equipment")
+    assert len(replica_reads) == 2
+
+    authorized_client.cookies.delete(database.sticky_cookie)
+    await authorized_client.get("/equipment")
+    assert len(replica_reads) == 3
+    # Нет здоровых реплик - читаем с основной БД
+    replicas.healthy[0] = False
+    response = await authorized_client.get("/equipment")
+    assert response.status_code == 200
+    assert len(replica_reads) == 3
+
+
+@pytest.mark.asyncio
+async def test_get_list_of_equipment_by_cursor(authorized_client: AsyncClient):
+    params = {"sorted_by": "title", "order": True, "limit": 2}
+    response = await authorized_client.get("/equipment", params=params)
+    first_page = response.json()
+    cursor = response.headers["X-Next-Cursor"]
+    assert 'rel="next"' in response.headers["Link"]
+    response = await authorized_client.get(
+        "/equipment", params=params | {"cursor": cursor}
+    )
+    second_page = response.json()
+    assert len(first_page) == 2 and len(second_page) == 1
+    assert first_page[-1]["title"] < second_page[0]["title"]
+    assert "X-Next-Cursor" not in response.headers
+    response = await authorized_client.get(
+        "/equipment", params={"sorted_by": "id", "cursor": cursor}
+    )
+    assert response.status_code == 400
+    for url in ("/equipment", "/categories", "/categories/2/"):
+        for limit in (0, -1, 101):
+            response = await authorized_client.get(url, params={"limit": limit})
+            assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_get_list_of_equipment_with_filters(authorized_client: AsyncClient):
+    params = {"min_price": 50, "max_price": 1000, "sorted_by": "price", "order": True}
+    response = await authorized_client.get("/equipment", params=params)
+    assert [item["title"] for item in response.json()] == [
+        "Пикачу",
+        "Надувная дакимакура",
+    ]
+    response = await authorized_client.get("/equipment", params={"is_available": False})
+    assert response.json() == []
+    response = await authorized_client.get("/equipment", params={"min_price": -1})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_total_count(authorized_client: AsyncClient):
+    response = await authorized_client.get("/equipment", params={"limit": 1})
+    assert "X-Total-Count" not in response.headers
+    response = await authorized_client.get(
+        "/equipment", params={"limit": 1, "count": True, "max_price": 100}
+    )
+    assert response.headers["X-Total-Count"] == "2"
+    response = await authorized_client.get(
+        "/categories/2/", params={"limit": 1, "count": True}
+    )
+    assert response.headers["X-Total-Count"] == "3"
+    response = await authorized_client.get(
+        "/categories/2/", params={"limit": 1, "count": True, "exact": True}
+    )
+    assert response.headers["X-Total-Count"] == "3"
+
+
+@pytest.mark.asyncio
+async def test_get_category_with_equipment_page(authorized_client: AsyncClient):
+    response = await authorized_client.get("/categories/2", params={"limit": 2})
+    data = response.json()
+    assert data["summary"] == {
+        "equipment_count": 3,
+        "available_count": 3,
+        "min_price": "20.00",
+        "max_price": "1000.00",
+    }
+    assert len(data["equipment"]) == 2
+    response = await authorized_client.get(
+        "/categories/2", params={"limit": 2, "cursor": data["next_cursor"]}
+    )
+    data = response.json()
+    assert [item["title"] for item in data["equipment"]] == ["Атомная бомба"]
+    assert data["next_cursor"] is None
+    response = await authorized_client.get("/categories/2", params={"limit": 1000})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_search_equipment(authorized_client: AsyncClient):
+    response = await authorized_client.get("/equipment/search", params={"q": "игрушка"})
+    assert [item["title"] for item in response.json()] == ["Пикачу"]
+    response = await authorized_client.get("/equipment/search", params={"q": "100%"})
+    assert response.json() == []
+    response = await authorized_client.get("/equipment/search", params={"q": ""})
+    assert response.status_code == 422
+    response = await authorized_client.get(
+        "/equipment/search", params={"q": "игрушка", "offset": -1}
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_export_own_equipment(authorized_client: AsyncClient):
+    response = await authorized_client.get("/export/me/equipment")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["title"] for row in rows] == [
+        "Пикачу",
+        "Надувная дакимакура",
+        "Атомная бомба",
+    ]
+    response = await authorized_client.get(
+        "/export/me/equipment", params={"format": "csv"}
+    )
+    lines = response.text.splitlines()
+    assert lines[0].startswith("id,title,description") and len(lines) == 4
+
+
+@pytest.mark.asyncio
+async def test_export_all_equipment_from_user(authorized_client: AsyncClient):
+    response = await authorized_client.get("/export/equipment")
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_get_equipment_by_ids(authorized_client: AsyncClient):
+    response = await authorized_client.get("/equipment", params={"ids": "3,99,1"})
+    assert [item["id"] for item in response.json()] == [3, 1]
+    assert response.headers["X-Missing-Ids"] == "99"
+    response = await authorized_client.post("/equipment/batch", json={"ids": [2, 3]})
+    assert [item["id"] for item in response.json()] == [2, 3]
+    assert "X-Missing-Ids" not in response.headers
+    response = await authorized_client.get("/equipment", params={"ids": "1,x"})
+    assert response.status_code == 400
+
+
 @pytest.mark.asyncio
 async def test_get_equipment(authorized_client: AsyncClient):
     response = await authorized_client.get("/equipment/1")
@@ -169,6 +471,58 @@ async def test_update_equipment(authorized_client: AsyncClient):
 async def test_delete_equipment(authorized_client: AsyncClient):
     response = await authorized_client.delete("/equipment/1")
     assert response.status_code == 204
+    response = await authorized_client.get("/categories/2/", params={"count": True})
+    assert response.headers["X-Total-Count"] == "2"
+
+
+@pytest.mark.asyncio
+async def test_import_equipment(authorized_client: AsyncClient):
+    rows = [
+        {
+            "title": "Батут",
+            "description": "Надувной",
+            "price_per_day": 300,
+            "category_id": 2,
+        },
+        {
+            "title": "Атомная бомба",
+            "description": "Дубликат",
+            "price_per_day": 1,
+            "category_id": 2,
+        },
+        {
+            "title": "Лодка",
+            "description": "Нет категории",
+            "price_per_day": 1,
+            "category_id": 99,
+        },
+        {
+            "title": "Матрас",
+            "description": "Отрицательная цена",
+            "price_per_day": -1,
+            "category_id": 2,
+        },
+        {
+            "title": "Я" * 201,
+            "description": "Не помещается в колонку",
+            "price_per_day": 1,
+            "category_id": 2,
+        },
+    ]
+    content = "\n".join(json.dumps(row, ensure_ascii=False) for row in rows) + "\n{oops"
+    response = await authorized_client.post(
+        "/equipment/import", content=content.encode()
+    )
+    data = response.json()
+    assert data["inserted"] == 1 and data["failed"] == 5
+    assert [error["row"] for error in data["errors"]] == [2, 3, 4, 5, 6]
+    content = 'title,description,price_per_day,category_id\nБассейн,"Надувной,\nдетский",150,2\n'
+    response = await authorized_client.post(
+        "/equipment/import", params={"format": "csv"}, content=content.encode()
+    )
+    assert response.json() == {"inserted": 1, "failed": 0, "errors": []}
+    response = await authorized_client.get("/categories/2/", params={"count": True})
+    assert response.headers["X-Total-Count"] == "4"
 
 
 # Тесты photos.py
@@ -193,6 +547,12 @@ async def test_get_photo(authorized_client: AsyncClient):
     assert response.content == file.getvalue()
 
 
+@pytest.mark.asyncio
+async def test_get_photo_of_other_equipment(authorized_client: AsyncClient):
+    response = await authorized_client.get("/equipment/3/photos/1")
+    assert response.status_code == 404
+
+
 @pytest.mark.asyncio
 async def test_update_photo(authorized_client: AsyncClient):
     new_file = io.BytesIO(b"haha")
@@ -219,6 +579,33 @@ async def test_add_photo_with_bigsize(authorized_client: AsyncClient):
     assert response.status_code == 413
 
 
+@pytest.mark.asyncio
+async def test_idempotent_photo(authorized_client: AsyncClient):
+    headers = {"Idempotency-Key": "photo-retry"}
+    first = await authorized_client.post(
+        "/equipment/2/photos",
+        files={"file": ("retry", io.BytesIO(b"retry"), "image/jpeg")},
+        headers=headers,
+    )
+    assert first.status_code == 201
+    retry = await authorized_client.post(
+        "/equipment/2/photos",
+        files={"file": ("retry", io.BytesIO(b"retry"), "image/jpeg")},
+        headers=headers,
+    )
+    assert retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    # Хешируется содержимое файла, а не только имя
+    response = await authorized_client.post(
+        "/equipment/2/photos",
+        files={"file": ("retry", io.BytesIO(b"other"), "image/jpeg")},
+        headers=headers,
+    )
+    assert response.status_code == 422
+    await authorized_client.delete(f"/equipment/2/photos/{first.json()['id']}")
+
+
 # Тесты orders.py
 @pytest.mark.asyncio
 async def test_add_order(authorized_client_2: AsyncClient):
@@ -229,6 +616,77 @@ async def test_add_order(authorized_client_2: AsyncClient):
     assert response.status_code == 201
 
 
+@pytest.mark.asyncio
+async def test_add_overlapping_order(authorized_client_2: AsyncClient):
+    response = await authorized_client_2.post(
+        "/orders?equipment_id=2",
+        json={"start_date": "2025-06-20", "end_date": "2025-06-25"},
+    )
+    assert response.status_code == 409
+    response = await authorized_client_2.post(
+        "/orders?equipment_id=2",
+        json={"start_date": "2025-06-22", "end_date": "2025-06-25"},
+    )
+    assert response.status_code == 201
+
+
+@pytest.mark.asyncio
+async def test_get_availability(authorized_client_2: AsyncClient):
+    params = {"from": "2025-06-01", "to": "2025-07-01"}
+    response = await authorized_client_2.get("/equipment/2/availability", params=params)
+    data = response.json()
+    assert data["busy"] == [
+        {"start": "2025-06-17T00:00:00Z", "end": "2025-06-22T00:00:00Z"},
+        {"start": "2025-06-22T00:00:00Z", "end": "2025-06-25T00:00:00Z"},
+    ]
+    assert data["free"] == [
+        {"start": "2025-06-01T00:00:00Z", "end": "2025-06-17T00:00:00Z"},
+        {"start": "2025-06-25T00:00:00Z", "end": "2025-07-01T00:00:00Z"},
+    ]
+    response = await authorized_client_2.get(
+        "/equipment/99/availability", params=params
+    )
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_calendar_skips_cache_after_concurrent_booking(
+    async_session: AsyncSession, monkeypatch
+):
+    calendar_cache.pop(3)
+    execute = async_session.execute
+
+    async def execute_and_book(*args, **kwargs):
+        # Заказ зафиксирован уже после того, как запрос построения прочитал брони
+        result = await execute(*args, **kwargs)
+        booking_added(
+            3, datetime(2030, 1, 1, tzinfo=UTC), datetime(2030, 1, 2, tzinfo=UTC)
+        )
+        return result
+
+    monkeypatch.setattr(async_session, "execute", execute_and_book)
+    await build_calendar(async_session, 3)
+    assert calendar_cache.get(3) is None
+    # Счетчик нужен только на время построения и не копится по оборудованию
+    assert 3 not in build_versions
+
+
+@pytest.mark.asyncio
+async def test_get_available_equipment(authorized_client_2: AsyncClient):
+    params = {"from": "2025-06-20", "to": "2025-06-21", "category_id": 2}
+    response = await authorized_client_2.get("/equipment/available", params=params)
+    ids = [item["id"] for item in response.json()]
+    assert 2 not in ids and 3 in ids
+    response = await authorized_client_2.get(
+        "/equipment/available", params=params | {"from": "2025-06-25"}
+    )
+    assert response.status_code == 400
+    response = await authorized_client_2.get(
+        "/equipment/available", params=params | {"to": "2025-06-21T00:00:00Z"}
+    )
+    assert [item["id"] for item in response.json()] == ids
+
+
 @pytest.mark.asyncio
 async def test_add_order_own_equipment(authorized_client: AsyncClient):
     response = await authorized_client.post(
@@ -245,6 +703,24 @@ async def test_get_orders(authorized_client_2: AsyncClient):
     assert isinstance(data, list)
 
 
+@pytest.mark.asyncio
+async def test_get_incoming_orders(authorized_client: AsyncClient):
+    params = {"status": "completed", "order": True, "limit": 1}
+    response = await authorized_client.get("/orders/incoming", params=params)
+    data = response.json()
+    assert data[0]["start_date"].startswith("2025-06-17")
+    assert data[0]["equipment"]["id"] == 2
+    response = await authorized_client.get(
+        "/orders/incoming",
+        params=params | {"cursor": response.headers["X-Next-Cursor"]},
+    )
+    assert response.json()[0]["start_date"].startswith("2025-06-22")
+    response = await authorized_client.get(
+        "/orders/incoming", params={"status": "upcoming"}
+    )
+    assert response.json() == []
+
+
 @pytest.mark.asyncio
 async def test_get_orders_from_noncustomer(client: AsyncClient):
     await client.post("/register", json={"username": "Alex", "password": "134"})
@@ -264,6 +740,156 @@ async def test_delete_order_from_noncustomer(authorized_client: AsyncClient):
 async def test_delete_order(authorized_client_2: AsyncClient):
     response = await authorized_client_2.delete("/orders/1")
     assert response.status_code == 204
+    response = await authorized_client_2.get(
+        "/equipment/2/availability", params={"from": "2025-06-01", "to": "2025-07-01"}
+    )
+    assert [interval["start"] for interval in response.json()["busy"]] == [
+        "2025-06-22T00:00:00Z"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_current_order_changes_availability(authorized_client_2: AsyncClient):
+    now = datetime.now(UTC)
+    response = await authorized_client_2.post(
+        "/orders?equipment_id=3",
+        json={
+            "start_date": (now - timedelta(days=1)).isoformat(),
+            "end_date": (now + timedelta(days=2)).isoformat(),
+        },
+    )
+    order_id = response.json()["id"]
+    response = await authorized_client_2.get("/equipment/3")
+    assert response.json()["is_available"] is False
+    await authorized_client_2.delete(f"/orders/{order_id}")
+    response = await authorized_client_2.get("/equipment/3")
+    assert response.json()["is_available"] is True
+
+
+@pytest.mark.asyncio
+async def test_refresh_availability(async_session: AsyncSession):
+    def is_available():
+        return async_session.scalar(
+            select(Equipment.is_available).where(Equipment.id == 3)
+        )
+
+    # Аренда закончилась, а флаг остался снятым: полный пересчет его вернет
+    await async_session.execute(
+        update(Equipment).where(Equipment.id == 3).values(is_available=False)
+    )
+    await async_session.commit()
+    since = await refresh_availability(Async_Session_Test)
+    assert await is_available() is True
+
+    # Будущая бронь наступила после прошлого пересчета
+    now = datetime.now(UTC)
+    order = Order(
+        customer_id=3,
+        equipment_id=3,
+        start_date=since + timedelta(microseconds=1),
+        end_date=now + timedelta(days=1),
+    )
+    async_session.add(order)
+    await async_session.commit()
+    since = await refresh_availability(Async_Session_Test, since)
+    assert await is_available() is False
+
+    # Заказы, не начавшиеся и не закончившиеся с прошлого раза, не проверяются
+    await async_session.execute(
+        update(Equipment).where(Equipment.id == 3).values(is_available=True)
+    )
+    await async_session.commit()
+    since = await refresh_availability(Async_Session_Test, since)
+    assert await is_available() is True
+
+    # Аренда закончилась после прошлого пересчета
+    order.end_date = datetime.now(UTC)
+    await async_session.execute(
+        update(Equipment).where(Equipment.id == 3).values(is_available=False)
+    )
+    await async_session.commit()
+    await refresh_availability(Async_Session_Test, since)
+    assert await is_available() is True
+    await async_session.delete(order)
+    await async_session.commit()
+
+
+@pytest.mark.asyncio
+async def test_idempotent_order(
+    authorized_client_2: AsyncClient, async_session: AsyncSession
+):
+    headers = {"Idempotency-Key": "order-retry"}
+    body = {"start_date": "2025-08-01", "end_date": "2025-08-05"}
+    first = await authorized_client_2.post(
+        "/orders?equipment_id=3", json=body, headers=headers
+    )
+    assert first.status_code == 201
+    retry = await authorized_client_2.post(
+        "/orders?equipment_id=3", json=body, headers=headers
+    )
+    assert retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    response = await authorized_client_2.post(
+        "/orders?equipment_id=3",
+        json=body | {"end_date": "2025-08-06"},
+        headers=headers,
+    )
+    assert response.status_code == 422
+    await authorized_client_2.delete(f"/orders/{first.json()['id']}")
+
+    await async_session.execute(
+        update(IdempotencyKey).values(expires_at=datetime.now(UTC))
+    )
+    await async_session.commit()
+    assert await sweep_expired(Async_Session_Test) >= 1
+    assert not await async_session.scalar(select(IdempotencyKey))
+
+
+@pytest.mark.asyncio
+async def test_idempotent_equipment(authorized_client: AsyncClient):
+    headers = {"Idempotency-Key": "equipment-retry"}
+    body = {
+        "title": "Повтор",
+        "description": "Создано повтором запроса",
+        "price_per_day": 5,
+        "category_id": 2,
+    }
+    first = await authorized_client.post("/equipment", json=body, headers=headers)
+    assert first.status_code == 201
+    retry = await authorized_client.post("/equipment", json=body, headers=headers)
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    response = await authorized_client.post(
+        "/equipment", json=body | {"price_per_day": 6}, headers=headers
+    )
+    assert response.status_code == 422
+    await authorized_client.delete(f"/equipment/{first.json()['id']}")
+
+
+@pytest.mark.asyncio
+async def test_quote_orders(authorized_client_2: AsyncClient, monkeypatch):
+    items = [
+        {"equipment_id": 3, "start_date": "2025-09-01", "end_date": "2025-09-04"},
+        {
+            "equipment_id": 3,
+            "start_date": "2025-09-01T00:00:00",
+            "end_date": "2025-09-02T12:00:00",
+        },
+        {"equipment_id": 99, "start_date": "2025-09-01", "end_date": "2025-09-02"},
+    ]
+    response = await authorized_client_2.post("/orders/quote", json={"items": items})
+    assert response.headers["X-Missing-Ids"] == "99"
+    data = response.json()
+    assert [line["total_price"] for line in data["items"]] == ["60.00", "20.00"]
+    assert data["total_price"] == "80.00"
+
+    monkeypatch.setattr(pricing, "partial_day_rule", "prorate")
+    response = await authorized_client_2.post("/orders/quote", json={"items": items})
+    assert response.json()["items"][1]["total_price"] == "30.00"
+    monkeypatch.setattr(pricing, "partial_day_rule", "ceil")
+    response = await authorized_client_2.post("/orders/quote", json={"items": items})
+    assert response.json()["items"][1]["total_price"] == "40.00"
 
 
 # Тесты валидации pydantic
@@ -0,0 +1,195 @@
+"""Тесты миграции c6e8a0b2d4f7 и обслуживания секций orders.
+
+Требуют PostgreSQL: задайте TEST_POSTGRES_URL (postgresql+asyncpg://...),
+иначе тесты пропускаются. Схема public пересоздается и накатывается миграциями.
+"""
+
+import asyncio
+import os
+from datetime import UTC, datetime
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from alembic import command
+from alembic.config import Config
+from app.maintenance import (
+    add_months,
+    archive_order_partitions,
+    archive_schema,
+    ensure_order_partitions,
+    partition_name,
+)
+
+postgres_url = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = [
+    pytest.mark.skipif(not postgres_url, reason="TEST_POSTGRES_URL is not set"),
+    pytest.mark.asyncio(loop_scope="session"),
+]
+
+before_partitioning = "b5d7f9a1c3e6"
+
+
+async def reset_schema(engine) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {archive_schema} CASCADE"))
+        await conn.execute(text("DROP SCHEMA public CASCADE"))
+        await conn.execute(text("CREATE SCHEMA public"))
+
+
+async def migrate(direction, revision: str) -> None:
+    # env.py сам запускает asyncio.run, поэтому миграции идут в отдельном потоке
+    await asyncio.to_thread(direction, Config("alembic.ini"), revision)
+
+
+@pytest.fixture(scope="module")
+async def engine(monkeypatch_module):
+    monkeypatch_module.setenv("DATABASE_URL", postgres_url)
+    engine = create_async_engine(postgres_url)
+    await reset_schema(engine)
+    yield engine
+    await reset_schema(engine)
+    await engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def monkeypatch_module():
+    with pytest.MonkeyPatch.context() as patch:
+        yield patch
+
+
+async def test_orders_partitioning_lifecycle(engine):
+    current = datetime.now(UTC).date().replace(day=1)
+    old = current.replace(year=current.year - 5)
+    future = add_months(current, 9)
+    session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    await migrate(command.upgrade, before_partitioning)
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "INSERT INTO users (username, hashed_password, role)"
+                " VALUES ('owner', '\\x00', 'user')"
+            )
+        )
+        await conn.execute(text("INSERT INTO categories (title) VALUES ('tools')"))
+        await conn.execute(
+            text(
+                "INSERT INTO equipment"
+                " (title, description, price_per_day, owner_id, category_id)"
+                " VALUES ('drill', 'drill', 1, 1, 1)"
+            )
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO orders (customer_id, equipment_id, start_date, end_date)"
+                " VALUES (1, 1, :old, :old_end), (1, 1, :current, :current_end)"
+            ),
+            {
+                "old": datetime.combine(old, datetime.min.time(), UTC),
+                "old_end": datetime.combine(
+                    old.replace(day=3), datetime.min.time(), UTC
+                ),
+                "current": datetime.combine(current, datetime.min.time(), UTC),
+                "current_end": datetime.combine(
+                    current.replace(day=3), datetime.min.time(), UTC
+                ),
+            },
+        )
+
+    await migrate(command.upgrade, "head")
+    async with engine.begin() as conn:
+        assert await conn.scalar(
+            text(
+                "SELECT 1 FROM pg_partitioned_table"
+                " WHERE partrelid = to_regclass('orders')"
+            )
+        )
+        assert await conn.scalar(text("SELECT count(*) FROM reservations")) == 2
+        assert (
+            await conn.scalar(text(f"SELECT count(*) FROM {partition_name(old)}")) == 1
+        )
+
+    # Бронь из прошлого месяца пересекается с заказом в начале текущего
+    previous = add_months(current, -1).replace(day=20)
+    async with engine.connect() as conn:
+        with pytest.raises(IntegrityError) as error:
+            await conn.execute(
+                text(
+                    "INSERT INTO reservations"
+                    " (order_id, equipment_id, start_date, end_date)"
+                    " VALUES (1000, 1, :start, :end)"
+                ),
+                {
+                    "start": datetime.combine(previous, datetime.min.time(), UTC),
+                    "end": datetime.combine(
+                        current.replace(day=2), datetime.min.time(), UTC
+                    ),
+                },
+            )
+        assert error.value.orig.sqlstate == "23P01"
+        await conn.rollback()
+
+    # Секции на 9 месяцев вперед еще нет: заказ попадает в orders_default
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "INSERT INTO orders (customer_id, equipment_id, start_date, end_date)"
+                " VALUES (1, 1, :start, :end)"
+            ),
+            {
+                "start": datetime.combine(future, datetime.min.time(), UTC),
+                "end": datetime.combine(
+                    future.replace(day=3), datetime.min.time(), UTC
+                ),
+            },
+        )
+        assert await conn.scalar(text("SELECT count(*) FROM orders_default")) == 1
+
+    created = await ensure_order_partitions(session_maker, months_ahead=12)
+    assert partition_name(future) in created
+    assert await ensure_order_partitions(session_maker, months_ahead=12) == []
+    async with engine.begin() as conn:
+        assert await conn.scalar(text("SELECT count(*) FROM orders_default")) == 0
+        assert (
+            await conn.scalar(text(f"SELECT count(*) FROM {partition_name(future)}"))
+            == 1
+        )
+
+    archived = await archive_order_partitions(session_maker, older_than_months=24)
+    assert archived[0] == partition_name(old)
+    assert partition_name(current) not in archived
+    async with engine.begin() as conn:
+        assert (
+            await conn.scalar(
+                text(f"SELECT count(*) FROM {archive_schema}.{partition_name(old)}")
+            )
+            == 1
+        )
+        assert await conn.scalar(text("SELECT count(*) FROM orders")) == 2
+        assert (
+            await conn.scalar(
+                text("SELECT count(*) FROM reservations WHERE order_id = 1")
+            )
+            == 0
+        )
+
+    await migrate(command.downgrade, before_partitioning)
+    async with engine.begin() as conn:
+        assert not await conn.scalar(
+            text(
+                "SELECT 1 FROM pg_partitioned_table"
+                " WHERE partrelid = to_regclass('orders')"
+            )
+        )
+        assert await conn.scalar(text("SELECT to_regclass('reservations')")) is None
+        assert await conn.scalar(
+            text(
+                "SELECT 1 FROM pg_constraint"
+                " WHERE conname = 'ex_orders_equipment_id_period'"
+            )
+        )
+        assert await conn.scalar(text("SELECT count(*) FROM orders")) == 2
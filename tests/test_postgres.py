@@ -0,0 +1,180 @@
+"""Тесты поведения, которое проверяется только на PostgreSQL.
+
+Требуют PostgreSQL: задайте TEST_POSTGRES_URL (postgresql+asyncpg://...),
+иначе тесты пропускаются. Таблицы пересоздаются по моделям.
+"""
+
+import asyncio
+import os
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event, insert, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import app
+from app.database import get_session
+from app.idempotency import Idempotency
+from app.imports import EquipmentImport
+from app.models import Base, Category, Equipment, Session, User
+from app.routers.equipment import search_equipment
+
+postgres_url = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = [
+    pytest.mark.skipif(not postgres_url, reason="TEST_POSTGRES_URL is not set"),
+    pytest.mark.asyncio(loop_scope="session"),
+]
+
+
+@pytest.fixture(scope="module")
+async def pg_session_maker():
+    engine = create_async_engine(postgres_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            insert(User), [{"username": "owner", "hashed_password": b"-"}]
+        )
+        await conn.execute(insert(Category), [{"title": "postgres"}])
+    yield async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+async def test_import_falls_back_to_row_inserts(pg_session_maker):
+    async def records():
+        for number, category_id in enumerate([1, 999, 1], start=1):
+            row = {
+                "title": f"import{number}",
+                "description": "postgres",
+                "price_per_day": 1,
+                "category_id": category_id,
+            }
+            yield number, row, None
+
+    async with pg_session_maker() as session:
+        importer = EquipmentImport(session, 1)
+        # Категория прошла проверку, но удалена до вставки: FK отклоняет пачку
+        importer.known_categories.add(999)
+        result = await importer.run(records())
+        titles = await session.scalars(
+            select(Equipment.title).where(Equipment.title.like("import%"))
+        )
+        assert sorted(titles) == ["import1", "import3"]
+    assert result.inserted == 2
+    assert [(error.row, error.detail) for error in result.errors] == [
+        (2, "Строка отклонена БД")
+    ]
+
+
+async def test_search_ranking_typos_and_indexes(pg_session_maker):
+    async with pg_session_maker() as session:
+        await session.execute(
+            insert(Equipment),
+            [
+                {
+                    "title": title,
+                    "description": description,
+                    "price_per_day": 1,
+                    "owner_id": 1,
+                    "category_id": 1,
+                }
+                for title, description in [
+                    ("Молоток", "Удобнее, чем перфоратор"),
+                    ("Перфоратор", "Ударный, для бетона"),
+                    ("Бетономешалка", "Объем 120 литров"),
+                ]
+            ],
+        )
+        await session.commit()
+
+        async def search(q: str) -> list[str]:
+            found = await search_equipment(
+                q=q, limit=10, offset=0, _current_user=None, session=session
+            )
+            return [equipment.title for equipment in found]
+
+        # Совпадение в наименовании (вес A) выше совпадения в описании (вес B)
+        assert await search("перфоратор") == ["Перфоратор", "Молоток"]
+        assert await search("бетономешалко") == ["Бетономешалка"]
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        bind = session.get_bind()
+        event.listen(bind, "before_cursor_execute", record)
+        try:
+            await search("бетон")
+        finally:
+            event.remove(bind, "before_cursor_execute", record)
+        statement, parameters = statements[-1]
+        # Таблица маленькая, поэтому проверяется, что индексы применимы к запросу
+        await session.execute(text("SET LOCAL enable_seqscan = off"))
+        conn = await session.connection()
+        driver = (await conn.get_raw_connection()).driver_connection
+        plan = await driver.fetchval(
+            "EXPLAIN (FORMAT JSON) " + statement, *(parameters or ())
+        )
+        assert "ix_equipment_search_vector" in plan
+        assert "ix_equipment_title_trgm" in plan
+
+
+async def test_idempotency_key_waits_for_running_request(pg_session_maker, monkeypatch):
+    async with pg_session_maker() as session:
+        session.add(Session(id="idempotency", user_id=1))
+        await session.commit()
+
+    async def override_get_session():
+        async with pg_session_maker() as session:
+            yield session
+
+    save = Idempotency.save
+
+    async def slow_save(self, response, status_code):
+        # Первый запрос держит транзакцию, пока приходит повтор
+        await asyncio.sleep(0.2)
+        await save(self, response, status_code)
+
+    monkeypatch.setattr(Idempotency, "save", slow_save)
+    app.dependency_overrides[get_session] = override_get_session
+    body = {
+        "title": "idempotent",
+        "description": "postgres",
+        "price_per_day": 1,
+        "category_id": 1,
+    }
+    try:
+        async with AsyncClient(
+            transport=ASGITransport(app=app),
+            base_url="http://test",
+            cookies={"session_id": "idempotency"},
+        ) as client:
+            first, retry = await asyncio.gather(
+                *(
+                    client.post(
+                        "/equipment",
+                        json=body,
+                        headers={"Idempotency-Key": "in-flight"},
+                    )
+                    for _ in range(2)
+                )
+            )
+    finally:
+        app.dependency_overrides.clear()
+    assert first.status_code == retry.status_code == 201
+    assert first.json() == retry.json()
+    assert {
+        first.headers.get("Idempotent-Replayed"),
+        retry.headers.get("Idempotent-Replayed"),
+    } == {"true", None}
+    async with pg_session_maker() as session:
+        titles = await session.scalars(
+            select(Equipment.title).where(Equipment.title == "idempotent")
+        )
+        assert list(titles) == ["idempotent"]
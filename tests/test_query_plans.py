@@ -0,0 +1,230 @@
+"""Регрессионные тесты планов запросов списочных эндпоинтов.
+
+Требуют PostgreSQL: задайте TEST_POSTGRES_URL (postgresql+asyncpg://...),
+иначе тесты пропускаются. Таблицы создаются по моделям и наполняются
+данными, затем эндпоинты вызываются через приложение, а каждый выполненный
+SQL-запрос прогоняется через EXPLAIN. Тест падает, если над Seq Scan по
+equipment, orders или reservations стоит Sort, то есть список собирается полным
+сканированием и сортировкой, а не чтением по индексу.
+"""
+
+import json
+import os
+from datetime import UTC, datetime, timedelta
+
+import bcrypt
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event, insert, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import app
+from app.database import get_session
+from app.models import Base, Category, Equipment, Order, Reservation, Session, User
+from app.supfunctions import sortdict
+
+postgres_url = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = [
+    pytest.mark.skipif(not postgres_url, reason="TEST_POSTGRES_URL is not set"),
+    pytest.mark.asyncio(loop_scope="session"),
+]
+
+users_count = 100
+categories_count = 50
+equipment_count = 20000
+checked_tables = ("equipment", "orders", "reservations")
+
+
+@pytest.fixture(scope="module")
+async def pg_engine():
+    engine = create_async_engine(postgres_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await conn.run_sync(Base.metadata.create_all)
+        password = bcrypt.hashpw(b"plan", bcrypt.gensalt())
+        await conn.execute(
+            insert(User),
+            [
+                {"username": f"user{i}", "hashed_password": password}
+                for i in range(users_count)
+            ],
+        )
+        await conn.execute(insert(Session), [{"id": "plan-test", "user_id": 1}])
+        await conn.execute(
+            insert(Category),
+            [{"title": f"category{i}"} for i in range(categories_count)],
+        )
+        await conn.execute(
+            insert(Equipment),
+            [
+                {
+                    "title": f"equipment{i}",
+                    "description": "plan test",
+                    "price_per_day": i % 1000,
+                    "is_available": i % 3 != 0,
+                    "owner_id": i % users_count + 1,
+                    "category_id": i % categories_count + 1,
+                }
+                for i in range(equipment_count)
+            ],
+        )
+        start = datetime(2025, 1, 1, tzinfo=UTC)
+        await conn.execute(
+            insert(Order),
+            [
+                {
+                    "customer_id": i % users_count + 1,
+                    "equipment_id": i + 1,
+                    "start_date": start,
+                    "end_date": start + timedelta(days=3),
+                    "total_price": 0,
+                }
+                for i in range(equipment_count)
+            ],
+        )
+        await conn.execute(
+            insert(Reservation),
+            [
+                {
+                    "order_id": i + 1,
+                    "equipment_id": i + 1,
+                    "start_date": start,
+                    "end_date": start + timedelta(days=3),
+                }
+                for i in range(equipment_count)
+            ],
+        )
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("ANALYZE"))
+    yield engine
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+@pytest.fixture
+async def pg_client(pg_engine):
+    session_maker = async_sessionmaker(bind=pg_engine, expire_on_commit=False)
+
+    async def override_get_session():
+        async with session_maker() as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    async with AsyncClient(
+        transport=ASGITransport(app=app),
+        base_url="http://test",
+        cookies={"session_id": "plan-test"},
+    ) as client:
+        await client.get("/me")
+        yield client
+    app.dependency_overrides.clear()
+
+
+def sorts_over_seq_scan(plan: dict, under_sort: bool = False) -> list[str]:
+    found = []
+    if (
+        under_sort
+        and plan["Node Type"] == "Seq Scan"
+        and plan["Relation Name"] in checked_tables
+    ):
+        found.append(plan["Relation Name"])
+    under_sort = under_sort or plan["Node Type"] == "Sort"
+    for child in plan.get("Plans", []):
+        found += sorts_over_seq_scan(child, under_sort)
+    return found
+
+
+async def assert_index_backed(pg_engine, client: AsyncClient, url: str) -> None:
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(pg_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = await client.get(url)
+        assert response.status_code == 200
+        if "X-Next-Cursor" in response.headers:
+            response = await client.get(
+                url, params={"cursor": response.headers["X-Next-Cursor"]}
+            )
+            assert response.status_code == 200
+    finally:
+        event.remove(pg_engine.sync_engine, "before_cursor_execute", record)
+
+    assert statements
+    async with pg_engine.connect() as conn:
+        driver = (await conn.get_raw_connection()).driver_connection
+        for statement, parameters in statements:
+            plan = json.loads(
+                await driver.fetchval(
+                    "EXPLAIN (FORMAT JSON) " + statement, *(parameters or ())
+                )
+            )[0]["Plan"]
+            assert not sorts_over_seq_scan(plan), f"{url}: {statement}"
+
+
+@pytest.mark.parametrize("order", ["true", "false"])
+@pytest.mark.parametrize("sorted_by", list(sortdict))
+async def test_equipment_list_plan(pg_engine, pg_client, sorted_by, order):
+    await assert_index_backed(
+        pg_engine, pg_client, f"/equipment?sorted_by={sorted_by}&order={order}"
+    )
+
+
+@pytest.mark.parametrize("order", ["true", "false"])
+@pytest.mark.parametrize("sorted_by", [key for key in sortdict if key != "category"])
+async def test_equipment_by_category_plan(pg_engine, pg_client, sorted_by, order):
+    await assert_index_backed(
+        pg_engine, pg_client, f"/categories/7/?sorted_by={sorted_by}&order={order}"
+    )
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        "is_available=true&max_price=100&sorted_by=price&order=true",
+        "is_available=false",
+        "owner_id=5&sorted_by=id",
+        "category_id=7&min_price=10&sorted_by=price",
+    ],
+)
+async def test_filtered_equipment_list_plan(pg_engine, pg_client, params):
+    await assert_index_backed(pg_engine, pg_client, f"/equipment?{params}")
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        "sorted_by=id",
+        "category_id=7&sorted_by=price&order=true",
+        "max_price=100&is_available=true",
+    ],
+)
+async def test_available_equipment_plan(pg_engine, pg_client, params):
+    await assert_index_backed(
+        pg_engine,
+        pg_client,
+        f"/equipment/available?from=2025-02-03&to=2025-02-07&{params}",
+    )
+
+
+async def test_category_page_plan(pg_engine, pg_client):
+    await assert_index_backed(pg_engine, pg_client, "/categories/7")
+
+
+async def test_orders_plan(pg_engine, pg_client):
+    await assert_index_backed(pg_engine, pg_client, "/orders")
+
+
+@pytest.mark.parametrize(
+    "params", ["", "order=true", "status=completed", "from=2025-01-02&to=2025-01-03"]
+)
+async def test_incoming_orders_plan(pg_engine, pg_client, params):
+    await assert_index_backed(pg_engine, pg_client, f"/orders/incoming?{params}")